@@ -0,0 +1,267 @@
+"""
+Access control module for the Expense Tracker Bot.
+Provides the hot-reloaded user whitelist, per-user rate limiting and the
+middleware that applies both once per incoming update.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update, User
+from dotenv import dotenv_values, find_dotenv
+
+from config import Config
+from structured_logging import LogSampler
+
+
+logger = logging.getLogger(__name__)
+
+
+class Whitelist:
+    """
+    Immutable set of allowed user IDs, reloaded when its source file changes.
+    
+    The source is ALLOWED_USERS_FILE if configured, otherwise the
+    ALLOWED_USERS entry of the .env file, if the file defines it. A value
+    set in the process environment is never replaced. Changes are detected by file
+    modification time, checked at most once per reload interval, so a
+    lookup normally costs a single frozenset membership test.
+    """
+    
+    def __init__(self, users: FrozenSet[int], source_path: Optional[str], reload_interval: float):
+        """
+        Initialize the whitelist.
+        
+        Args:
+            users: Initially allowed user IDs
+            source_path: File watched for changes, or None to disable reloading
+            reload_interval: Minimum seconds between checks of the source file
+        """
+        self._users = users
+        self._source_path = source_path
+        self._reload_interval = reload_interval
+        self._next_check = time.monotonic() + reload_interval
+        self._mtime = self._get_mtime()
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_config(cls) -> "Whitelist":
+        """
+        Create a whitelist from the application configuration.
+        
+        Returns:
+            Whitelist watching ALLOWED_USERS_FILE or the .env file
+        """
+        source_path = Config.ALLOWED_USERS_FILE or None
+        if source_path is None:
+            dotenv_path = find_dotenv(usecwd=True)
+            # load_dotenv does not override the process environment, so a
+            # .env file only defines the whitelist if it has the entry and
+            # the environment did not set a different value
+            dotenv_users = dotenv_values(dotenv_path).get("ALLOWED_USERS") if dotenv_path else None
+            if dotenv_users is not None and os.getenv("ALLOWED_USERS", dotenv_users) == dotenv_users:
+                source_path = dotenv_path
+        return cls(Config.ALLOWED_USERS, source_path, Config.WHITELIST_RELOAD_INTERVAL)
+    
+    @property
+    def users(self) -> FrozenSet[int]:
+        """Currently allowed user IDs."""
+        return self._users
+    
+    def __contains__(self, user_id: int) -> bool:
+        """Check whether a user is allowed, reloading the source if it changed."""
+        if self._source_path and time.monotonic() >= self._next_check:
+            self._maybe_reload()
+        return user_id in self._users
+    
+    def _get_mtime(self) -> Optional[float]:
+        """Get modification time of the source file, or None if unavailable."""
+        if not self._source_path:
+            return None
+        try:
+            return os.stat(self._source_path).st_mtime
+        except OSError:
+            return None
+    
+    def _read_source(self) -> Optional[str]:
+        """Read the raw user ID list from the source file, or None if it has none."""
+        if self._source_path == Config.ALLOWED_USERS_FILE:
+            with open(self._source_path, encoding="utf-8") as f:
+                return f.read()
+        values = dotenv_values(self._source_path)
+        if "ALLOWED_USERS" not in values:
+            return None
+        return values["ALLOWED_USERS"] or ""
+    
+    def _maybe_reload(self) -> None:
+        """Reload the whitelist if the source file was modified."""
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + self._reload_interval
+            
+            mtime = self._get_mtime()
+            if mtime is None or mtime == self._mtime:
+                return
+            self._mtime = mtime
+            
+            try:
+                source = self._read_source()
+                if source is None:
+                    logger.warning("Keeping previous whitelist, ALLOWED_USERS was removed from .env")
+                    return
+                users = Config.parse_user_ids(source)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Keeping previous whitelist, failed to reload: {e}")
+                return
+            
+            if users != self._users:
+                self._users = users
+                Config.ALLOWED_USERS = users
+                logger.info(f"Whitelist reloaded: {len(users)} allowed users")
+
+
+class RateLimiter:
+    """
+    Per-user token bucket rate limiter.
+    
+    Each user gets a bucket of `burst` tokens refilled at `rate_per_minute`;
+    every update consumes one token and is rejected when the bucket is empty.
+    """
+    
+    def __init__(self, rate_per_minute: float, burst: int):
+        """
+        Initialize the rate limiter.
+        
+        Args:
+            rate_per_minute: Sustained number of updates allowed per minute
+            burst: Maximum number of updates allowed in a quick burst
+        """
+        self._rate = rate_per_minute / 60.0
+        self._burst = float(max(1, burst))
+        # user_id -> (tokens, last refill timestamp)
+        self._buckets: Dict[int, tuple] = {}
+    
+    def allow(self, user_id: int) -> bool:
+        """
+        Consume a token for a user if one is available.
+        
+        Args:
+            user_id: Telegram user ID
+        
+        Returns:
+            bool: True if the update may proceed, False if rate limited
+        """
+        if self._rate <= 0:
+            return True
+        
+        now = time.monotonic()
+        tokens, last = self._buckets.get(user_id, (self._burst, now))
+        tokens = min(self._burst, tokens + (now - last) * self._rate)
+        
+        if tokens < 1.0:
+            self._buckets[user_id] = (tokens, now)
+            return False
+        
+        self._buckets[user_id] = (tokens - 1.0, now)
+        return True
+
+
+class AccessMiddleware(BaseMiddleware):
+    """
+    Outer update middleware enforcing the whitelist and rate limit.
+    
+    Registered on the dispatcher's update observer, so every update type
+    (messages, callback queries, ...) is checked exactly once before any
+    handler runs. Warnings about dropped updates are sampled, so spam
+    cannot flood the log. A rate-limited message is answered with a notice,
+    at most once per NOTICE_INTERVAL per user, so nobody assumes an
+    expense was saved when it was dropped.
+    """
+    
+    # Seconds between "slow down" notices to the same user
+    NOTICE_INTERVAL = 30.0
+    
+    def __init__(
+        self,
+        whitelist: Whitelist,
+        rate_limiter: RateLimiter,
+        log_sampler: Optional[LogSampler] = None
+    ):
+        """
+        Initialize the middleware.
+        
+        Args:
+            whitelist: Allowed users
+            rate_limiter: Per-user rate limiter
+            log_sampler: Sampler for dropped-update warnings
+        """
+        self.whitelist = whitelist
+        self.rate_limiter = rate_limiter
+        self.log_sampler = log_sampler or LogSampler()
+        # user_id -> time of the last rate limit notice
+        self._notified: Dict[int, float] = {}
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        """
+        Pass the update on only for allowed, non-rate-limited users.
+        
+        Args:
+            handler: Next handler in chain
+            event: Incoming update
+            data: Additional data
+        
+        Returns:
+            Result of handler or None if the update is dropped
+        """
+        user: Optional[User] = data.get("event_from_user")
+        
+        if user is None or user.id not in self.whitelist:
+            self._log_dropped("unauthorized", "Unauthorized access attempt", user)
+            # Silently ignore updates from unauthorized users
+            return None
+        
+        if not self.rate_limiter.allow(user.id):
+            self._log_dropped("rate_limited", "Rate limit exceeded", user)
+            await self._notify_rate_limited(event, user)
+            return None
+        
+        return await handler(event, data)
+    
+    async def _notify_rate_limited(self, event: TelegramObject, user: User) -> None:
+        """Tell a user their message was dropped, at most once per NOTICE_INTERVAL."""
+        if not isinstance(event, Update) or event.message is None:
+            return
+        
+        now = time.monotonic()
+        if now - self._notified.get(user.id, float("-inf")) < self.NOTICE_INTERVAL:
+            return
+        self._notified[user.id] = now
+        
+        try:
+            await event.message.answer(
+                "⏳ Too many messages at once. Your last message was not saved, "
+                "please send it again in a minute."
+            )
+        except Exception as e:
+            logger.warning(f"Failed to send rate limit notice: {e}")
+    
+    def _log_dropped(self, event: str, text: str, user: Optional[User]) -> None:
+        """Log a dropped update unless the event is being sampled out."""
+        suppressed = self.log_sampler.allow(event)
+        if suppressed is None:
+            return
+        user_id = user.id if user else None
+        logger.warning(
+            f"{text} from user {user_id}",
+            extra={"event": event, "user_id": user_id, "suppressed": suppressed}
+        )
@@ -0,0 +1,93 @@
+"""
+Background tasks module for the Expense Tracker Bot.
+Runs periodic maintenance jobs on the event loop alongside polling.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Coroutine, Set
+
+from google_service import GoogleSheetsService
+from sqlite_storage import MirroredStorage
+
+
+logger = logging.getLogger(__name__)
+
+# Running background tasks, kept referenced until cancelled
+_tasks: Set[asyncio.Task] = set()
+
+
+def start_background_task(coro: Coroutine, name: str) -> asyncio.Task:
+    """
+    Start a coroutine as a background task.
+    
+    Args:
+        coro: Coroutine to run
+        name: Task name used in logs
+    
+    Returns:
+        The created task
+    """
+    task = asyncio.create_task(coro, name=name)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+async def cancel_background_tasks() -> None:
+    """Cancel all background tasks and wait for them to finish."""
+    tasks = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_worksheet_precreation(
+    service: GoogleSheetsService,
+    days_ahead: int,
+    check_interval: float
+) -> None:
+    """
+    Keep the current and upcoming month's worksheets created ahead of use.
+    
+    Moves worksheet creation out of the first write of each month, so month
+    rollover adds no latency to saving an expense.
+    
+    Args:
+        service: Google Sheets service
+        days_ahead: Create next month's worksheet this many days early
+        check_interval: Seconds between checks
+    """
+    while True:
+        now = datetime.now()
+        try:
+            await asyncio.to_thread(service.ensure_month_worksheet, now)
+            await asyncio.to_thread(service.ensure_month_worksheet, now + timedelta(days=days_ahead))
+        except Exception as e:
+            logger.warning(f"Worksheet pre-creation failed: {e}")
+        
+        await asyncio.sleep(check_interval)
+
+
+async def run_mirror_sync(storage: MirroredStorage, interval: float, batch_size: int) -> None:
+    """
+    Push locally saved expenses to Google Sheets in batches.
+    
+    Keeps syncing without pause while full batches are pending, then waits
+    for the next interval.
+    
+    Args:
+        storage: Mirrored storage to sync
+        interval: Seconds between syncs when caught up
+        batch_size: Maximum number of expenses per Sheets append
+    """
+    while True:
+        try:
+            synced = await asyncio.to_thread(storage.sync_pending, batch_size)
+        except Exception as e:
+            logger.warning(f"Mirror sync to Google Sheets failed: {e}")
+            synced = 0
+        
+        if synced < batch_size:
+            await asyncio.sleep(interval)
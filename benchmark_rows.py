@@ -0,0 +1,117 @@
+"""
+Microbenchmark of the expense row hot path.
+
+Measures parse -> validate -> serialize for one text message, comparing the
+current dataclass rows validated once with the earlier approach of two
+pydantic models per message, plus batch validation for imports.
+
+Usage:
+    python benchmark_rows.py [--number 20000]
+"""
+
+import argparse
+import timeit
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+from validators import ExpenseInput, ParsedMessage
+
+
+MESSAGES = ["food 2500 coffee with friends", "transport 500", "24.12 gifts 15000 for mom"]
+
+
+class LegacyParsedMessage(BaseModel):
+    """Parsed message as a pydantic model (previous implementation)."""
+    
+    category: Optional[str] = None
+    amount: Optional[float] = None
+    comment: Optional[str] = ""
+    date: Optional[datetime] = None
+
+
+class LegacyExpenseInput(BaseModel):
+    """Expense as a pydantic model with field validators (previous implementation)."""
+    
+    category: str = Field(..., min_length=1, max_length=50)
+    amount: float = Field(..., gt=0)
+    comment: Optional[str] = Field(default="", max_length=200)
+    user_id: int
+    date: datetime = Field(default_factory=datetime.now)
+    idempotency_key: Optional[str] = Field(default=None, max_length=100)
+    
+    @field_validator('category')
+    @classmethod
+    def validate_category(cls, v: str) -> str:
+        return v.strip().lower()
+    
+    @field_validator('comment')
+    @classmethod
+    def validate_comment(cls, v: Optional[str]) -> str:
+        return "" if v is None else v.strip()
+    
+    def to_sheet_row(self) -> list:
+        return [
+            self.date.strftime("%Y-%m-%d %H:%M"), self.category, self.amount,
+            self.comment, self.user_id, self.idempotency_key or ""
+        ]
+
+
+def legacy_path(text: str) -> list:
+    """Parse into a pydantic model, validate into another one, serialize."""
+    parsed = ParsedMessage.parse_from_text(text)
+    parsed = LegacyParsedMessage(
+        category=parsed.category, amount=parsed.amount, comment=parsed.comment, date=parsed.date
+    )
+    kwargs = {'category': parsed.category, 'amount': parsed.amount, 'comment': parsed.comment,
+              'user_id': 123456789, 'idempotency_key': "123456789:42"}
+    if parsed.date:
+        kwargs['date'] = parsed.date
+    return LegacyExpenseInput(**kwargs).to_sheet_row()
+
+
+def current_path(text: str) -> list:
+    """Parse into a dataclass, validate once into the row dataclass, serialize."""
+    parsed = ParsedMessage.parse_from_text(text)
+    kwargs = {'category': parsed.category, 'amount': parsed.amount, 'comment': parsed.comment,
+              'user_id': 123456789, 'idempotency_key': "123456789:42"}
+    if parsed.date:
+        kwargs['date'] = parsed.date
+    return ExpenseInput.validate(**kwargs).to_sheet_row()
+
+
+def report(name: str, seconds: float, operations: int) -> None:
+    """Print the time per operation."""
+    print(f"{name:<40} {seconds / operations * 1e6:8.2f} us/op")
+
+
+def main() -> None:
+    """Run the benchmarks."""
+    parser = argparse.ArgumentParser(description="Benchmark the expense row hot path.")
+    parser.add_argument("--number", type=int, default=20000, help="Messages per measurement")
+    args = parser.parse_args()
+    
+    # Warm up cached validators
+    current_path(MESSAGES[0])
+    legacy_path(MESSAGES[0])
+    
+    for label, fn in (("two pydantic models per message", legacy_path), ("dataclass row, validated once", current_path)):
+        seconds = min(timeit.repeat(
+            lambda: [fn(text) for text in MESSAGES], number=args.number // len(MESSAGES), repeat=5
+        ))
+        report(label, seconds, args.number // len(MESSAGES) * len(MESSAGES))
+    
+    items = [
+        {'category': "food", 'amount': 100 + i, 'comment': "import", 'user_id': 1, 'idempotency_key': f"import:{i}"}
+        for i in range(1000)
+    ]
+    batches = max(1, args.number // len(items))
+    seconds = min(timeit.repeat(lambda: [ExpenseInput.validate(**item) for item in items], number=batches, repeat=5))
+    report("import: validate() per item", seconds, batches * len(items))
+    seconds = min(timeit.repeat(lambda: ExpenseInput.validate_many(items), number=batches, repeat=5))
+    report("import: validate_many() batch", seconds, batches * len(items))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,24 +6,28 @@ Initializes and runs the Telegram bot with aiogram 3.x.
 import asyncio
 import logging
 import sys
+from functools import partial
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
-from aiogram.types import Message
-from aiogram.filters import CommandStart
 
+from access import AccessMiddleware, RateLimiter, Whitelist
+from background import (
+    cancel_background_tasks, run_mirror_sync, run_worksheet_precreation, start_background_task
+)
 from config import Config
-from handlers import router
+from profiling import LoopWatchdog
+from handlers import (
+    announce_recurring_expenses, budget_store, recurring_scheduler, recurring_store, router, storage
+)
+from recorder import UpdateRecorder
+from sqlite_storage import MirroredStorage
+from storage import get_sheets_service
+from structured_logging import CorrelationMiddleware, LogSampler, setup_logging
 
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Configure logging: records are written to stdout by a background thread
+setup_logging(Config.LOG_LEVEL, Config.LOG_FORMAT)
 
 logger = logging.getLogger(__name__)
 
@@ -44,10 +48,48 @@ async def on_startup(bot: Bot) -> None:
         BotCommand(command="start", description="Start the bot"),
         BotCommand(command="stats", description="View statistics"),
         BotCommand(command="categories", description="List categories"),
+        BotCommand(command="budget", description="Monthly budgets"),
+        BotCommand(command="recurring", description="Recurring expenses"),
+        BotCommand(command="sheet", description="Personal spreadsheet"),
+        BotCommand(command="undo", description="Remove last expense"),
+        BotCommand(command="edit", description="Fix a recent expense"),
         BotCommand(command="help", description="Get help"),
     ]
     await bot.set_my_commands(commands)
     logger.info("Bot commands set successfully")
+    
+    # Create upcoming monthly worksheets before the first expense needs them
+    sheets_service = get_sheets_service(storage)
+    if sheets_service is not None:
+        start_background_task(
+            run_worksheet_precreation(
+                sheets_service,
+                days_ahead=Config.WORKSHEET_PRECREATE_DAYS,
+                check_interval=Config.WORKSHEET_PRECREATE_INTERVAL
+            ),
+            name="worksheet-precreation"
+        )
+    
+    # Report callbacks blocking the event loop
+    if Config.SLOW_CALLBACK_THRESHOLD > 0:
+        start_background_task(LoopWatchdog(Config.SLOW_CALLBACK_THRESHOLD).run(), name="loop-watchdog")
+    
+    # Materialize recurring expenses, catching up occurrences missed while down
+    start_background_task(
+        recurring_scheduler.run(partial(announce_recurring_expenses, bot)),
+        name="recurring-expenses"
+    )
+    
+    # Push locally saved expenses to Google Sheets
+    if isinstance(storage, MirroredStorage):
+        start_background_task(
+            run_mirror_sync(
+                storage,
+                interval=Config.MIRROR_SYNC_INTERVAL,
+                batch_size=Config.MIRROR_SYNC_BATCH_SIZE
+            ),
+            name="mirror-sync"
+        )
 
 
 async def on_shutdown(bot: Bot) -> None:
@@ -58,6 +100,10 @@ async def on_shutdown(bot: Bot) -> None:
         bot: Bot instance
     """
     logger.info("Bot is shutting down...")
+    await cancel_background_tasks()
+    storage.close()
+    budget_store.close()
+    recurring_store.close()
     await bot.session.close()
 
 
@@ -86,28 +132,22 @@ async def main() -> None:
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
     
-    # Add middleware for access control
-    @dp.message.middleware()
-    async def access_control_middleware(handler, event: Message, data: dict):
-        """
-        Middleware to check if user is allowed to use the bot.
-        
-        Args:
-            handler: Next handler in chain
-            event: Incoming message
-            data: Additional data
-            
-        Returns:
-            Result of handler or None if user is not allowed
-        """
-        user_id = event.from_user.id
-        
-        if user_id not in Config.ALLOWED_USERS:
-            logger.warning(f"Unauthorized access attempt from user {user_id}")
-            # Silently ignore messages from unauthorized users
-            return None
-        
-        return await handler(event, data)
+    # Tag all logs of an update with its ID, before any other middleware runs
+    dp.update.outer_middleware(CorrelationMiddleware())
+    
+    # Record incoming updates (including dropped ones) for offline replay
+    recorder = None
+    if Config.RECORD_UPDATES_PATH:
+        recorder = UpdateRecorder(Config.RECORD_UPDATES_PATH, Config.RECORD_UPDATES_SALT or None)
+        dp.update.outer_middleware(recorder)
+        logger.info(f"Recording updates to {Config.RECORD_UPDATES_PATH}")
+    
+    # Add middleware for access control and rate limiting (one check per update)
+    dp.update.outer_middleware(AccessMiddleware(
+        whitelist=Whitelist.from_config(),
+        rate_limiter=RateLimiter(Config.RATE_LIMIT_PER_MINUTE, Config.RATE_LIMIT_BURST),
+        log_sampler=LogSampler(Config.LOG_SAMPLE_INTERVAL, Config.LOG_SAMPLE_BURST)
+    ))
     
     # Start polling
     try:
@@ -116,6 +156,8 @@ async def main() -> None:
     except Exception as e:
         logger.error(f"Error during polling: {e}")
     finally:
+        if recorder is not None:
+            recorder.close()
         await bot.session.close()
 
 
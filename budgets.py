@@ -0,0 +1,344 @@
+"""
+Budget tracking module.
+Stores per-user, per-category monthly budgets locally and keeps running
+month totals so threshold alerts need no Google Sheets reads.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from config import Config
+from sqlite_storage import LocalDatabase
+from validators import ExpenseInput
+
+
+class BudgetAlert(NamedTuple):
+    """Budget threshold crossed by a new expense."""
+    
+    category: str
+    month: str
+    threshold: int
+    spent: float
+    limit: float
+
+
+class BudgetStatus(NamedTuple):
+    """Budget with the amount spent in the current month."""
+    
+    category: str
+    spent: float
+    limit: float
+
+
+def month_key(date: datetime) -> str:
+    """Get the month key used for running totals (e.g. '2025-12')."""
+    return date.strftime("%Y-%m")
+
+
+class BudgetStore:
+    """
+    Local store of budgets and running monthly spending totals.
+    
+    Every saved expense in a budgeted category is added to its
+    user/category/month total with one local transaction; the total is then
+    compared against the budget to decide whether an alert threshold was
+    crossed. Each threshold alerts once per month. Totals are only kept
+    while a budget exists. Idempotency keys of counted expenses are
+    remembered for the last two months, so a retried or redelivered expense
+    is not counted twice.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS budgets (
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            month_limit REAL NOT NULL,
+            PRIMARY KEY (user_id, category)
+        );
+        CREATE TABLE IF NOT EXISTS month_totals (
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            month TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            alerted INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, category, month)
+        );
+        CREATE TABLE IF NOT EXISTS counted_expenses (
+            key TEXT PRIMARY KEY,
+            month TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_counted_expenses_month ON counted_expenses (month);
+    """
+    
+    def __init__(self, path: str, thresholds: Sequence[int] = (80, 100)):
+        """
+        Open the budget store.
+        
+        Args:
+            path: Local database file path
+            thresholds: Alert thresholds in percent of the budget
+        """
+        self._db = LocalDatabase(path, self.SCHEMA)
+        self.thresholds = sorted(thresholds)
+        self._pruned_month: Optional[str] = None
+    
+    def set_budget(
+        self,
+        user_id: int,
+        category: str,
+        limit: float,
+        records: Optional[List[Dict]] = None
+    ) -> float:
+        """
+        Set or replace a monthly budget.
+        
+        Stored expenses seed the current month's total in the same
+        transaction. Keyed expenses already counted by record_expense are
+        skipped rather than the total replaced, so an expense saved while
+        the records were being read is counted exactly once.
+        
+        Args:
+            user_id: Telegram user ID
+            category: Expense category
+            limit: Monthly budget amount
+            records: This month's stored expense records, needed when no
+                total is kept for the month yet
+        
+        Returns:
+            Amount spent in the category this month
+        """
+        month = month_key(datetime.now())
+        
+        with self._db.transaction() as db:
+            db.execute(
+                "INSERT INTO budgets (user_id, category, month_limit) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id, category) DO UPDATE SET month_limit = excluded.month_limit",
+                (user_id, category, limit)
+            )
+            row = db.execute(
+                "SELECT total FROM month_totals WHERE user_id = ? AND category = ? AND month = ?",
+                (user_id, category, month)
+            ).fetchone()
+            
+            if records is not None:
+                seeded = 0.0
+                for key, amount in category_amounts(records, category):
+                    if key:
+                        cursor = db.execute(
+                            "INSERT OR IGNORE INTO counted_expenses (key, month) VALUES (?, ?)",
+                            (key, month)
+                        )
+                        # A fresh total also takes expenses counted under a removed budget
+                        if cursor.rowcount == 0 and row is not None:
+                            continue
+                    elif row is not None:
+                        # Unkeyed expenses cannot be told apart from counted ones
+                        continue
+                    seeded += amount
+                
+                db.execute(
+                    "INSERT INTO month_totals (user_id, category, month, total) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (user_id, category, month) DO UPDATE SET total = total + excluded.total",
+                    (user_id, category, month, seeded)
+                )
+            
+            # Re-arm alerts for the current month against the new limit
+            db.execute(
+                "UPDATE month_totals SET alerted = 0 WHERE user_id = ? AND category = ? AND month = ?",
+                (user_id, category, month)
+            )
+            row = db.execute(
+                "SELECT total FROM month_totals WHERE user_id = ? AND category = ? AND month = ?",
+                (user_id, category, month)
+            ).fetchone()
+        return row['total'] if row else 0.0
+    
+    def remove_budget(self, user_id: int, category: str) -> bool:
+        """
+        Remove a monthly budget and the running totals kept for it.
+        
+        Args:
+            user_id: Telegram user ID
+            category: Expense category
+        
+        Returns:
+            bool: True if a budget was removed
+        """
+        with self._db.transaction() as db:
+            cursor = db.execute(
+                "DELETE FROM budgets WHERE user_id = ? AND category = ?",
+                (user_id, category)
+            )
+            db.execute(
+                "DELETE FROM month_totals WHERE user_id = ? AND category = ?",
+                (user_id, category)
+            )
+            return cursor.rowcount > 0
+    
+    def get_month_total(self, user_id: int, category: str, date: datetime) -> Optional[float]:
+        """
+        Get a running month total.
+        
+        Args:
+            user_id: Telegram user ID
+            category: Expense category
+            date: Any date within the month
+        
+        Returns:
+            Amount spent in the month, or None if no total is kept yet
+        """
+        rows = self._db.query(
+            "SELECT total FROM month_totals WHERE user_id = ? AND category = ? AND month = ?",
+            (user_id, category, month_key(date))
+        )
+        return rows[0]['total'] if rows else None
+    
+    def get_budgets(self, user_id: int) -> List[BudgetStatus]:
+        """
+        Get a user's budgets with current month spending.
+        
+        Args:
+            user_id: Telegram user ID
+        
+        Returns:
+            List of budget statuses sorted by category
+        """
+        rows = self._db.query(
+            "SELECT b.category, b.month_limit, COALESCE(t.total, 0) AS spent "
+            "FROM budgets b LEFT JOIN month_totals t "
+            "ON t.user_id = b.user_id AND t.category = b.category AND t.month = ? "
+            "WHERE b.user_id = ? ORDER BY b.category",
+            (month_key(datetime.now()), user_id)
+        )
+        return [BudgetStatus(row['category'], row['spent'], row['month_limit']) for row in rows]
+    
+    def record_expense(self, expense: ExpenseInput) -> List[BudgetAlert]:
+        """
+        Add a saved expense to its running month total and check the budget.
+        
+        Expenses in categories without a budget are not counted.
+        
+        Args:
+            expense: Expense that was just saved
+        
+        Returns:
+            Alerts for thresholds crossed by this expense (usually empty)
+        """
+        month = month_key(expense.date)
+        
+        with self._db.transaction() as db:
+            budget = db.execute(
+                "SELECT month_limit FROM budgets WHERE user_id = ? AND category = ?",
+                (expense.user_id, expense.category)
+            ).fetchone()
+            if budget is None:
+                return []
+            
+            if expense.idempotency_key:
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO counted_expenses (key, month) VALUES (?, ?)",
+                    (expense.idempotency_key, month)
+                )
+                if cursor.rowcount == 0:
+                    return []
+                self._prune_counted_keys(db)
+            
+            db.execute(
+                "INSERT INTO month_totals (user_id, category, month, total) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (user_id, category, month) DO UPDATE SET total = total + excluded.total",
+                (expense.user_id, expense.category, month, expense.amount)
+            )
+            row = db.execute(
+                "SELECT total, alerted FROM month_totals WHERE user_id = ? AND category = ? AND month = ?",
+                (expense.user_id, expense.category, month)
+            ).fetchone()
+            
+            if budget['month_limit'] <= 0:
+                return []
+            
+            percent = row['total'] / budget['month_limit'] * 100
+            crossed = [t for t in self.thresholds if row['alerted'] < t <= percent]
+            if not crossed:
+                return []
+            
+            db.execute(
+                "UPDATE month_totals SET alerted = ? WHERE user_id = ? AND category = ? AND month = ?",
+                (crossed[-1], expense.user_id, expense.category, month)
+            )
+        
+        # Only report the highest threshold crossed at once
+        return [BudgetAlert(expense.category, month, crossed[-1], row['total'], budget['month_limit'])]
+    
+    def forget_expense(self, expense: ExpenseInput) -> None:
+        """
+        Subtract a deleted or edited expense from its running month total.
+        
+        Expenses with an idempotency key are only subtracted if they were
+        counted, and can be counted again afterwards.
+        
+        Args:
+            expense: Expense as it was counted
+        """
+        month = month_key(expense.date)
+        
+        with self._db.transaction() as db:
+            if expense.idempotency_key:
+                cursor = db.execute(
+                    "DELETE FROM counted_expenses WHERE key = ?",
+                    (expense.idempotency_key,)
+                )
+                if cursor.rowcount == 0:
+                    return
+            
+            db.execute(
+                "UPDATE month_totals SET total = MAX(total - ?, 0) "
+                "WHERE user_id = ? AND category = ? AND month = ?",
+                (expense.amount, expense.user_id, expense.category, month)
+            )
+    
+    def _prune_counted_keys(self, db) -> None:
+        """Forget counted expense keys older than the previous month, once per month."""
+        now = datetime.now()
+        current = month_key(now)
+        if self._pruned_month == current:
+            return
+        
+        previous = month_key(now.replace(day=1) - timedelta(days=1))
+        db.execute("DELETE FROM counted_expenses WHERE month < ?", (previous,))
+        self._pruned_month = current
+    
+    def close(self) -> None:
+        """Close the database connection."""
+        self._db.close()
+
+
+def create_budget_store() -> BudgetStore:
+    """
+    Create the budget store from the application configuration.
+    
+    Returns:
+        BudgetStore using LOCAL_DB_PATH and BUDGET_ALERT_THRESHOLDS
+    """
+    return BudgetStore(Config.LOCAL_DB_PATH, Config.BUDGET_ALERT_THRESHOLDS)
+
+
+def category_amounts(records: List[Dict], category: str) -> List[Tuple[str, float]]:
+    """
+    Get the idempotency keys and amounts of records in a category.
+    
+    Args:
+        records: Expense records keyed by spreadsheet headers
+        category: Category to select
+    
+    Returns:
+        (key, amount) pairs; the key is empty for rows written without one
+    """
+    amounts = []
+    for record in records:
+        if record.get('Category') != category:
+            continue
+        try:
+            amounts.append((str(record.get('Key') or ""), float(record.get('Amount', 0))))
+        except (ValueError, TypeError):
+            continue
+    return amounts
@@ -3,13 +3,16 @@ Configuration module for the Expense Tracker Bot.
 Loads environment variables and provides application settings.
 """
 
+import logging
 import os
-from typing import Set
+from typing import FrozenSet, List
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 class Config:
     """Application configuration class."""
@@ -21,8 +24,72 @@ class Config:
     GOOGLE_SHEET_NAME: str = os.getenv("GOOGLE_SHEET_NAME", "Expense Tracker")
     GOOGLE_CREDENTIALS_PATH: str = os.getenv("GOOGLE_CREDENTIALS_PATH", "credentials.json")
     
+    # Storage backend: "sheets", "sqlite" or "mirror" (SQLite synced to Sheets)
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "sheets").strip().lower()
+    LOCAL_DB_PATH: str = os.getenv("LOCAL_DB_PATH", "expenses.db")
+    
+    # Mirror mode: seconds between syncs and maximum rows pushed per sync
+    MIRROR_SYNC_INTERVAL: float = float(os.getenv("MIRROR_SYNC_INTERVAL", "5"))
+    MIRROR_SYNC_BATCH_SIZE: int = int(os.getenv("MIRROR_SYNC_BATCH_SIZE", "200"))
+    
+    # Budget alert thresholds in percent of the monthly budget
+    BUDGET_ALERT_THRESHOLDS: List[int] = sorted(
+        int(t) for t in os.getenv("BUDGET_ALERT_THRESHOLDS", "80,100").split(",") if t.strip()
+    )
+    
+    # Google Sheets connection pool
+    SHEETS_POOL_SIZE: int = int(os.getenv("SHEETS_POOL_SIZE", "4"))
+    SHEETS_TOKEN_REFRESH_MARGIN: int = int(os.getenv("SHEETS_TOKEN_REFRESH_MARGIN", "300"))
+    SHEETS_HEALTH_CHECK_INTERVAL: int = int(os.getenv("SHEETS_HEALTH_CHECK_INTERVAL", "300"))
+    
+    # Per-user spreadsheets: open handles cached per pooled connection
+    SHEETS_SPREADSHEET_CACHE_SIZE: int = int(os.getenv("SHEETS_SPREADSHEET_CACHE_SIZE", "32"))
+    
+    # Pre-create next month's worksheet this many days before the month starts,
+    # checking every WORKSHEET_PRECREATE_INTERVAL seconds
+    WORKSHEET_PRECREATE_DAYS: int = int(os.getenv("WORKSHEET_PRECREATE_DAYS", "3"))
+    WORKSHEET_PRECREATE_INTERVAL: int = int(os.getenv("WORKSHEET_PRECREATE_INTERVAL", "3600"))
+    
+    # Number of recently written idempotency keys remembered locally
+    IDEMPOTENCY_CACHE_SIZE: int = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+    
+    # Recent expenses per user that /edit and /undo can change
+    EDIT_HISTORY_SIZE: int = int(os.getenv("EDIT_HISTORY_SIZE", "10"))
+    
     # Allowed Users (whitelist)
-    ALLOWED_USERS: Set[int] = set()
+    ALLOWED_USERS: FrozenSet[int] = frozenset()
+    
+    # Users allowed to run admin commands such as /profile
+    ADMIN_USERS: FrozenSet[int] = frozenset()
+    
+    # Optional file with allowed user IDs, re-read on change without restart
+    ALLOWED_USERS_FILE: str = os.getenv("ALLOWED_USERS_FILE", "")
+    
+    # Seconds between checks of the whitelist source for changes
+    WHITELIST_RELOAD_INTERVAL: float = float(os.getenv("WHITELIST_RELOAD_INTERVAL", "5"))
+    
+    # Per-user rate limit (token bucket): sustained updates per minute and burst size
+    RATE_LIMIT_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+    RATE_LIMIT_BURST: int = int(os.getenv("RATE_LIMIT_BURST", "10"))
+    
+    # Logging: level, "json" or "text" output, and sampling of high-volume
+    # warnings (at most LOG_SAMPLE_BURST per LOG_SAMPLE_INTERVAL seconds)
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json").strip().lower()
+    LOG_SAMPLE_INTERVAL: float = float(os.getenv("LOG_SAMPLE_INTERVAL", "60"))
+    LOG_SAMPLE_BURST: int = int(os.getenv("LOG_SAMPLE_BURST", "5"))
+    
+    # Append anonymized incoming updates to this JSONL file for replay.py;
+    # the salt keeps pseudonymous IDs stable across restarts
+    RECORD_UPDATES_PATH: str = os.getenv("RECORD_UPDATES_PATH", "")
+    RECORD_UPDATES_SALT: str = os.getenv("RECORD_UPDATES_SALT", "")
+    
+    # /profile: longest allowed window and seconds between stack samples
+    PROFILE_MAX_SECONDS: int = int(os.getenv("PROFILE_MAX_SECONDS", "60"))
+    PROFILE_SAMPLE_INTERVAL: float = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+    
+    # Log callbacks blocking the event loop longer than this many seconds (0 disables)
+    SLOW_CALLBACK_THRESHOLD: float = float(os.getenv("SLOW_CALLBACK_THRESHOLD", "0"))
     
     # Default categories
     DEFAULT_CATEGORIES = [
@@ -30,16 +97,45 @@ class Config:
         "health", "utilities", "education", "other"
     ]
     
+    @staticmethod
+    def parse_user_ids(users_str: str) -> FrozenSet[int]:
+        """
+        Parse user IDs separated by commas, whitespace or newlines.
+        
+        Args:
+            users_str: Text containing user IDs
+            
+        Returns:
+            Frozen set of user IDs
+            
+        Raises:
+            ValueError: If any entry is not an integer
+        """
+        return frozenset(int(user_id) for user_id in users_str.replace(",", " ").split())
+    
     @classmethod
     def load_allowed_users(cls) -> None:
-        """Load allowed user IDs from environment variable."""
+        """Load allowed user IDs from ALLOWED_USERS_FILE or the environment variable."""
         users_str = os.getenv("ALLOWED_USERS", "")
+        if cls.ALLOWED_USERS_FILE:
+            try:
+                with open(cls.ALLOWED_USERS_FILE, encoding="utf-8") as f:
+                    users_str = f.read()
+            except OSError as e:
+                logger.warning(f"Cannot read ALLOWED_USERS_FILE: {e}")
+        
         if users_str:
             try:
-                cls.ALLOWED_USERS = {int(user_id.strip()) for user_id in users_str.split(",") if user_id.strip()}
+                cls.ALLOWED_USERS = cls.parse_user_ids(users_str)
             except ValueError:
-                print("Warning: Invalid user IDs in ALLOWED_USERS. Using empty whitelist.")
-                cls.ALLOWED_USERS = set()
+                logger.warning("Invalid user IDs in ALLOWED_USERS. Using empty whitelist.")
+                cls.ALLOWED_USERS = frozenset()
+        
+        try:
+            cls.ADMIN_USERS = cls.parse_user_ids(os.getenv("ADMIN_USERS", ""))
+        except ValueError:
+            logger.warning("Invalid user IDs in ADMIN_USERS. No admins configured.")
+            cls.ADMIN_USERS = frozenset()
     
     @classmethod
     def validate(cls) -> bool:
@@ -50,15 +146,19 @@ class Config:
             bool: True if configuration is valid, False otherwise.
         """
         if not cls.TELEGRAM_TOKEN:
-            print("Error: TELEGRAM_TOKEN is not set in environment variables.")
+            logger.error("TELEGRAM_TOKEN is not set in environment variables.")
+            return False
+        
+        if cls.STORAGE_BACKEND not in ("sheets", "sqlite", "mirror"):
+            logger.error(f"Unknown STORAGE_BACKEND '{cls.STORAGE_BACKEND}'.")
             return False
         
-        if not os.path.exists(cls.GOOGLE_CREDENTIALS_PATH):
-            print(f"Error: Google credentials file not found at {cls.GOOGLE_CREDENTIALS_PATH}")
+        if cls.STORAGE_BACKEND != "sqlite" and not os.path.exists(cls.GOOGLE_CREDENTIALS_PATH):
+            logger.error(f"Google credentials file not found at {cls.GOOGLE_CREDENTIALS_PATH}")
             return False
         
         if not cls.ALLOWED_USERS:
-            print("Warning: No users in whitelist. Bot will not respond to anyone.")
+            logger.warning("No users in whitelist. Bot will not respond to anyone.")
         
         return True
 
@@ -0,0 +1,347 @@
+"""
+Response rendering module for the Expense Tracker Bot.
+Builds HTML texts for bot replies and caches them where possible.
+"""
+
+from collections import OrderedDict
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from budgets import BudgetAlert, BudgetStatus
+from config import Config
+from recurring import RecurringRule
+from validators import ExpenseInput
+
+
+STATS_HEADER = "📊 <b>Your Expense Statistics</b>\n\n"
+
+STATS_PERIOD_TEMPLATE = (
+    "<b>{title}:</b>\n"
+    "Total: <b>{total:.2f}</b> ({count} expenses)\n"
+    "{lines}"
+)
+
+STATS_CATEGORY_LINE = "  • {category}: {amount:.2f}\n"
+
+STATS_EMPTY_LINE = "  No expenses yet\n"
+
+STATS_PERIOD_TITLES = (
+    ('today', "📅 Today"),
+    ('week', "📆 This Week"),
+    ('month', "📈 This Month"),
+)
+
+
+@lru_cache(maxsize=None)
+def render_start_text() -> str:
+    """
+    Render the /start welcome message.
+    
+    Returns:
+        HTML welcome text
+    """
+    return (
+        "👋 <b>Welcome to Expense Tracker Bot!</b>\n\n"
+        "I'll help you track your expenses and save them to Google Sheets.\n\n"
+        "<b>How to add an expense:</b>\n"
+        "Send a message in this format:\n"
+        "<code>category amount comment</code>\n\n"
+        "<b>Examples:</b>\n"
+        "• <code>food 2500 coffee at Starbucks</code>\n"
+        "• <code>transport 500 taxi</code>\n"
+        "• <code>24.12 shopping 15000 new shoes</code> (with date)\n\n"
+        "You can also send just a number, and I'll ask for the category.\n\n"
+        "<b>Available commands:</b>\n"
+        "/start - Show this message\n"
+        "/stats - View your statistics\n"
+        "/categories - List all categories\n"
+        "/budget - Set monthly budgets\n"
+        "/recurring - Manage recurring expenses\n"
+        "/undo - Remove your last expense\n"
+        "/edit - Fix a recent expense\n"
+        "/sheet - Use your own spreadsheet\n"
+        "/help - Get help\n\n"
+        "Let's start tracking! 💰"
+    )
+
+
+@lru_cache(maxsize=None)
+def render_help_text() -> str:
+    """
+    Render the /help message.
+    
+    Returns:
+        HTML help text
+    """
+    return (
+        "📖 <b>How to use Expense Tracker Bot</b>\n\n"
+        "<b>Adding expenses:</b>\n"
+        "Format: <code>category amount comment</code>\n\n"
+        "<b>With date:</b>\n"
+        "Format: <code>DD.MM category amount comment</code>\n\n"
+        "<b>Examples:</b>\n"
+        "✅ <code>food 2500 lunch</code>\n"
+        "✅ <code>transport 300</code>\n"
+        "✅ <code>24.12 food 500 coffee</code> (with date)\n"
+        "✅ <code>2500</code> (I'll ask for category)\n\n"
+        "<b>Common categories:</b>\n"
+        f"{', '.join(Config.DEFAULT_CATEGORIES)}\n\n"
+        "<b>Commands:</b>\n"
+        "/stats - View statistics (today/week/month)\n"
+        "/categories - See all your categories\n"
+        "/budget - Set monthly budgets (<code>/budget food 50000</code>)\n"
+        "/recurring - Repeat expenses automatically "
+        "(<code>/recurring add monthly 1 rent 150000</code>)\n"
+        "/sheet - Keep your expenses in your own spreadsheet "
+        "(<code>/sheet SPREADSHEET_LINK</code>)\n"
+        "/undo - Remove your last expense\n"
+        "/edit - Fix a recent expense (<code>/edit #2 food 2500 lunch</code>)\n"
+        "/help - Show this help message\n\n"
+        "All your expenses are automatically saved to Google Sheets! 📊"
+    )
+
+
+def _render_period(title: str, stats: Dict) -> str:
+    """
+    Render statistics block for a single period.
+    
+    Args:
+        title: Period title shown to the user
+        stats: Period statistics with total, count and by_category
+    
+    Returns:
+        HTML text block for the period
+    """
+    by_category = stats['by_category']
+    if by_category:
+        lines = "".join(
+            STATS_CATEGORY_LINE.format(category=category, amount=amount)
+            for category, amount in sorted(by_category.items(), key=lambda x: x[1], reverse=True)
+        )
+    else:
+        lines = STATS_EMPTY_LINE
+    
+    return STATS_PERIOD_TEMPLATE.format(
+        title=title,
+        total=stats['total'],
+        count=stats['count'],
+        lines=lines
+    )
+
+
+def render_stats(summary: Dict[str, Dict]) -> str:
+    """
+    Render the /stats message from a statistics summary.
+    
+    Args:
+        summary: Mapping of period name ('today', 'week', 'month') to statistics
+    
+    Returns:
+        HTML statistics text
+    """
+    blocks = [_render_period(title, summary[period]) for period, title in STATS_PERIOD_TITLES]
+    return STATS_HEADER + "\n".join(blocks)
+
+
+def render_budgets(budgets: List[BudgetStatus]) -> str:
+    """
+    Render the /budget overview.
+    
+    Args:
+        budgets: User's budgets with current month spending
+    
+    Returns:
+        HTML budget overview text
+    """
+    if not budgets:
+        return (
+            "💼 <b>No budgets set.</b>\n\n"
+            "Set one with <code>/budget category amount</code>\n"
+            "Example: <code>/budget food 50000</code>\n"
+            "Remove one with <code>/budget food off</code>"
+        )
+    
+    lines = "".join(
+        f"• {budget.category}: {budget.spent:.2f} / {budget.limit:.2f} "
+        f"({budget.spent / budget.limit * 100:.0f}%)\n"
+        for budget in budgets
+    )
+    return f"💼 <b>Monthly budgets:</b>\n\n{lines}"
+
+
+def render_budget_alert(alert: BudgetAlert) -> str:
+    """
+    Render a budget threshold alert.
+    
+    Args:
+        alert: Crossed budget threshold
+    
+    Returns:
+        HTML alert text
+    """
+    icon = "🚨" if alert.threshold >= 100 else "⚠️"
+    month_label = datetime.strptime(alert.month, "%Y-%m").strftime("%B %Y")
+    return (
+        f"{icon} <b>Budget alert: {alert.category}</b>\n\n"
+        f"You have spent <b>{alert.spent:.2f}</b> of <b>{alert.limit:.2f}</b> "
+        f"({alert.spent / alert.limit * 100:.0f}%) in {month_label}."
+    )
+
+
+RECURRING_USAGE = (
+    "Add: <code>/recurring add monthly 1 rent 150000 flat</code>\n"
+    "     <code>/recurring add weekly mon gym 5000</code>\n"
+    "     <code>/recurring add daily transport 300</code>\n"
+    "Remove: <code>/recurring remove ID</code>"
+)
+
+WEEKDAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+def _describe_schedule(rule: RecurringRule) -> str:
+    """Describe how often a recurring rule repeats."""
+    if rule.frequency == 'weekly':
+        return f"every {WEEKDAY_NAMES[rule.day]}"
+    if rule.frequency == 'monthly':
+        return f"monthly on day {rule.day}"
+    return "daily"
+
+
+def render_recurring_rule(rule: RecurringRule) -> str:
+    """
+    Render a single recurring rule line.
+    
+    Args:
+        rule: Stored recurring rule
+    
+    Returns:
+        HTML text line
+    """
+    comment = f" ({rule.comment})" if rule.comment else ""
+    return (
+        f"#{rule.id} <b>{rule.category}</b> {rule.amount:.2f}{comment}, "
+        f"{_describe_schedule(rule)}, next {rule.next_run.strftime('%d.%m.%Y')}"
+    )
+
+
+def render_recurring_rules(rules: List[RecurringRule]) -> str:
+    """
+    Render the /recurring overview.
+    
+    Args:
+        rules: User's recurring rules
+    
+    Returns:
+        HTML overview text
+    """
+    if not rules:
+        return f"🔁 <b>No recurring expenses.</b>\n\n{RECURRING_USAGE}"
+    
+    lines = "\n".join(f"• {render_recurring_rule(rule)}" for rule in rules)
+    return f"🔁 <b>Recurring expenses:</b>\n\n{lines}\n\n{RECURRING_USAGE}"
+
+
+def render_recurring_saved(expenses: List[ExpenseInput]) -> str:
+    """
+    Render the notice about automatically saved recurring expenses.
+    
+    Args:
+        expenses: Materialized expenses of one chat
+    
+    Returns:
+        HTML notice text
+    """
+    lines = "\n".join(
+        f"• {expense.date.strftime('%d.%m.%Y')} <b>{expense.category}</b> {expense.amount:.2f}"
+        for expense in expenses
+    )
+    return f"🔁 <b>Recurring expenses saved:</b>\n\n{lines}"
+
+
+EDIT_USAGE = (
+    "Fix the last expense: <code>/edit food 2500 lunch</code>\n"
+    "Fix another one: <code>/edit #2 food 2500 lunch</code>\n"
+    "The date is kept unless you give one in the same month."
+)
+
+
+def render_expense_line(expense: ExpenseInput) -> str:
+    """
+    Render a single expense line.
+    
+    Args:
+        expense: Saved expense
+    
+    Returns:
+        HTML text line
+    """
+    comment = f" ({expense.comment})" if expense.comment else ""
+    return f"{expense.date.strftime('%d.%m.%Y')} <b>{expense.category}</b> {expense.amount:.2f}{comment}"
+
+
+def render_recent_expenses(expenses: List[ExpenseInput]) -> str:
+    """
+    Render the /edit overview of recent expenses.
+    
+    Args:
+        expenses: User's recent expenses, newest first
+    
+    Returns:
+        HTML overview text
+    """
+    if not expenses:
+        return "✏️ <b>No recent expenses to edit.</b>"
+    
+    lines = "\n".join(f"#{number} {render_expense_line(expense)}" for number, expense in enumerate(expenses, 1))
+    return f"✏️ <b>Recent expenses:</b>\n\n{lines}\n\n{EDIT_USAGE}"
+
+
+class StatsCache:
+    """
+    Bounded LRU cache of rendered /stats messages.
+    
+    Holds one entry per user, tagged with the user's data version and the
+    day it was rendered on, so a new write or a date change invalidates it.
+    """
+    
+    def __init__(self, max_size: int = 256):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_size: Maximum number of users with a cached message
+        """
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, Tuple[int, date, str]]" = OrderedDict()
+    
+    def get(self, user_id: int, version: int) -> Optional[str]:
+        """
+        Get a cached stats message.
+        
+        Args:
+            user_id: Telegram user ID
+            version: User's current data version
+        
+        Returns:
+            Rendered message or None if missing or stale
+        """
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] != version or entry[1] != date.today():
+            return None
+        self._entries.move_to_end(user_id)
+        return entry[2]
+    
+    def put(self, user_id: int, version: int, text: str) -> None:
+        """
+        Store a rendered stats message.
+        
+        Args:
+            user_id: Telegram user ID
+            version: User's data version the message was rendered from
+            text: Rendered message
+        """
+        self._entries[user_id] = (version, date.today(), text)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
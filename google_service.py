@@ -3,23 +3,44 @@ Google Sheets service module.
 Handles all interactions with Google Sheets API for expense tracking.
 """
 
+import logging
+import threading
 import gspread
 from google.oauth2.service_account import Credentials
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Set, Tuple
 from config import Config
+from idempotency import RecentKeys
+from row_index import RowIndex, RowLocation, create_row_index, parse_updated_rows
+from sheets_pool import SheetsClientPool, SheetsConnection, is_connection_error
+from singleflight import SingleFlight
+from structured_logging import timed
+from tenants import SpreadsheetDirectory, create_spreadsheet_directory
 from validators import ExpenseInput
 
 
+logger = logging.getLogger(__name__)
+
+
 class GoogleSheetsService:
-    """Service class for Google Sheets operations."""
+    """
+    Service class for Google Sheets operations.
+    
+    Users routed to their own spreadsheet in the SpreadsheetDirectory read
+    and write only that spreadsheet; everyone else shares GOOGLE_SHEET_NAME.
+    The row of every appended expense is kept in a RowIndex, so recent
+    expenses can be edited or deleted without reading the worksheet.
+    """
     
     SCOPES = [
         'https://www.googleapis.com/auth/spreadsheets',
         'https://www.googleapis.com/auth/drive'
     ]
     
-    HEADER_ROW = ["Date", "Category", "Amount", "Comment", "User ID"]
+    HEADER_ROW = ["Date", "Category", "Amount", "Comment", "User ID", "Key"]
+    
+    # 1-based column holding the idempotency key
+    KEY_COLUMN = HEADER_ROW.index("Key") + 1
     
     MONTH_NAMES = {
         1: "January", 2: "February", 3: "March", 4: "April",
@@ -27,44 +48,130 @@ class GoogleSheetsService:
         9: "September", 10: "October", 11: "November", 12: "December"
     }
     
-    def __init__(self):
-        """Initialize Google Sheets service with credentials."""
-        self.client = None
-        self.sheet = None
-        self.worksheet = None
-        self._current_month_key = None
+    def __init__(
+        self,
+        directory: Optional[SpreadsheetDirectory] = None,
+        row_index: Optional[RowIndex] = None
+    ):
+        """
+        Initialize Google Sheets service with credentials.
+        
+        Args:
+            directory: User to spreadsheet routing; loaded from the local
+                database if not given
+            row_index: Rows of recent expenses; opened from the local
+                database if not given
+        """
+        self.pool: Optional[SheetsClientPool] = None
+        self.directory = directory or create_spreadsheet_directory()
+        self.row_index = row_index or create_row_index()
+        self._data_versions: Dict[int, int] = {}
+        self._worksheet_versions: Dict[Tuple[str, str], int] = {}
+        self._worksheet_versions_lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._recent_keys = RecentKeys(Config.IDEMPOTENCY_CACHE_SIZE)
+        self._seeded_worksheets: Set[Tuple[str, str]] = set()
+        self._seed_lock = threading.Lock()
+        self._worksheet_lock = threading.Lock()
+        self._known_worksheets: Set[Tuple[Optional[str], str]] = set()
         self._connect()
     
     def _connect(self) -> None:
         """
-        Establish connection to Google Sheets.
+        Create the connection pool and open the spreadsheet once to fail fast.
         
         Raises:
             Exception: If connection fails
         """
         try:
-            creds = Credentials.from_service_account_file(
-                Config.GOOGLE_CREDENTIALS_PATH,
-                scopes=self.SCOPES
+            self.pool = SheetsClientPool(
+                size=Config.SHEETS_POOL_SIZE,
+                credentials_factory=self._load_credentials,
+                spreadsheet_opener=self._get_or_create_sheet,
+                refresh_margin=Config.SHEETS_TOKEN_REFRESH_MARGIN,
+                health_check_interval=Config.SHEETS_HEALTH_CHECK_INTERVAL,
+                spreadsheet_cache_size=Config.SHEETS_SPREADSHEET_CACHE_SIZE
             )
-            self.client = gspread.authorize(creds)
-            self._get_or_create_sheet()
+            with self.pool.connection() as conn:
+                self._get_or_create_monthly_worksheet(conn.spreadsheet)
         except Exception as e:
-            print(f"Error connecting to Google Sheets: {e}")
+            logger.error(f"Error connecting to Google Sheets: {e}")
             raise
     
-    def _get_or_create_sheet(self) -> None:
-        """Get existing spreadsheet or create a new one with header row."""
+    def _load_credentials(self) -> Credentials:
+        """Load service account credentials for a new pooled connection."""
+        return Credentials.from_service_account_file(
+            Config.GOOGLE_CREDENTIALS_PATH,
+            scopes=self.SCOPES
+        )
+    
+    def _get_or_create_sheet(self, client: gspread.Client) -> gspread.Spreadsheet:
+        """Get existing spreadsheet or create a new one."""
         try:
             # Try to open existing spreadsheet
-            self.sheet = self.client.open(Config.GOOGLE_SHEET_NAME)
+            return client.open(Config.GOOGLE_SHEET_NAME)
         except gspread.SpreadsheetNotFound:
             # Create new spreadsheet
-            self.sheet = self.client.create(Config.GOOGLE_SHEET_NAME)
-            print(f"Created new spreadsheet: {Config.GOOGLE_SHEET_NAME}")
+            sheet = client.create(Config.GOOGLE_SHEET_NAME)
+            logger.info(f"Created new spreadsheet: {Config.GOOGLE_SHEET_NAME}")
+            return sheet
+    
+    def close(self) -> None:
+        """Close pooled connections, the routing directory and the row index."""
+        if self.pool is not None:
+            self.pool.close()
+        self.directory.close()
+        self.row_index.close()
+    
+    def get_service_account_email(self) -> str:
+        """Get the service account address spreadsheets must be shared with."""
+        return self._load_credentials().service_account_email
+    
+    def _open_spreadsheet(self, conn: SheetsConnection, user_id: Optional[int]) -> gspread.Spreadsheet:
+        """Open the spreadsheet a user is routed to on a pooled connection."""
+        return conn.open_spreadsheet(self.directory.get(user_id))
+    
+    def route_user(self, user_id: int, spreadsheet_key: str) -> str:
+        """
+        Route a user's expenses to their own spreadsheet.
+        
+        The spreadsheet is opened first, so a key that is wrong or not shared
+        with the service account is rejected. Earlier expenses stay where
+        they were written.
+        
+        Args:
+            user_id: Telegram user ID
+            spreadsheet_key: Key of the target spreadsheet
+            
+        Returns:
+            str: Title of the spreadsheet
+            
+        Raises:
+            Exception: If the spreadsheet cannot be opened
+        """
+        with self.pool.connection() as conn:
+            spreadsheet = conn.open_spreadsheet(spreadsheet_key)
+            self._get_or_create_monthly_worksheet(spreadsheet)
+            title = spreadsheet.title
+        
+        self.directory.set(user_id, spreadsheet_key)
+        self._bump_data_version(user_id)
+        return title
+    
+    def unroute_user(self, user_id: int) -> bool:
+        """
+        Route a user back to the shared spreadsheet.
         
-        # Set worksheet to current month
-        self._get_or_create_monthly_worksheet()
+        Args:
+            user_id: Telegram user ID
+            
+        Returns:
+            bool: True if the user had their own spreadsheet
+        """
+        removed = self.directory.remove(user_id)
+        if removed:
+            self._bump_data_version(user_id)
+        return removed
     
     def _get_month_sheet_name(self, date: Optional[datetime] = None) -> str:
         """Get worksheet name for a given month (e.g., 'December 2025')."""
@@ -73,50 +180,200 @@ class GoogleSheetsService:
         month_name = self.MONTH_NAMES[date.month]
         return f"{month_name} {date.year}"
     
-    def _get_or_create_monthly_worksheet(self, date: Optional[datetime] = None) -> None:
+    def _get_or_create_monthly_worksheet(
+        self,
+        sheet: gspread.Spreadsheet,
+        date: Optional[datetime] = None
+    ) -> gspread.Worksheet:
         """Get or create worksheet for the specified month."""
         sheet_name = self._get_month_sheet_name(date)
         
         try:
             # Try to get existing worksheet
-            self.worksheet = self.sheet.worksheet(sheet_name)
+            with timed(logger, "sheets.get_worksheet", worksheet=sheet_name):
+                return sheet.worksheet(sheet_name)
         except gspread.WorksheetNotFound:
-            # Create new worksheet for this month
-            self.worksheet = self.sheet.add_worksheet(title=sheet_name, rows=1000, cols=10)
-            self.worksheet.append_row(self.HEADER_ROW)
-            print(f"Created new monthly worksheet: {sheet_name}")
+            pass
         
-        self._current_month_key = sheet_name
+        # Serialize creation so concurrent first-of-month writes create one tab
+        with self._worksheet_lock:
+            try:
+                return sheet.worksheet(sheet_name)
+            except gspread.WorksheetNotFound:
+                return self._create_monthly_worksheet(sheet, sheet_name)
     
-    def _ensure_worksheet_for_date(self, date: Optional[datetime] = None) -> None:
-        """Ensure worksheet exists for the given date, always checking the sheet."""
+    def _create_monthly_worksheet(self, sheet: gspread.Spreadsheet, sheet_name: str) -> gspread.Worksheet:
+        """Create a monthly worksheet with a bold, frozen header row."""
+        with timed(logger, "sheets.create_worksheet", worksheet=sheet_name):
+            worksheet = sheet.add_worksheet(title=sheet_name, rows=1000, cols=10)
+            worksheet.append_row(self.HEADER_ROW)
+            worksheet.format("1:1", {"textFormat": {"bold": True}})
+            worksheet.freeze(rows=1)
+        logger.info(f"Created new monthly worksheet: {sheet_name}")
+        return worksheet
+    
+    def ensure_month_worksheet(self, date: datetime) -> None:
+        """
+        Make sure the worksheet for a month exists, creating it ahead of time.
+        
+        Used by the background pre-creation task so the first expense of a
+        month does not pay for creating its worksheet. Covers the shared
+        spreadsheet and every routed one. Months already confirmed in this
+        process are skipped without an API call.
+        
+        Args:
+            date: Any date within the month
+        """
         sheet_name = self._get_month_sheet_name(date)
         
+        for spreadsheet_key in [None, *self.directory.spreadsheet_keys()]:
+            if (spreadsheet_key, sheet_name) in self._known_worksheets:
+                continue
+            
+            try:
+                with self.pool.connection() as conn:
+                    self._get_or_create_monthly_worksheet(conn.open_spreadsheet(spreadsheet_key), date)
+            except Exception as e:
+                # One unreachable spreadsheet must not block the others
+                logger.warning(
+                    f"Error creating worksheet {sheet_name} in {spreadsheet_key or Config.GOOGLE_SHEET_NAME}: {e}"
+                )
+                continue
+            self._known_worksheets.add((spreadsheet_key, sheet_name))
+    
+    def _ensure_worksheet_for_date(
+        self,
+        sheet: gspread.Spreadsheet,
+        date: Optional[datetime] = None
+    ) -> gspread.Worksheet:
+        """Ensure worksheet exists for the given date, always checking the sheet."""
         # Always verify worksheet exists (it could have been deleted)
-        try:
-            self.worksheet = self.sheet.worksheet(sheet_name)
-        except gspread.WorksheetNotFound:
-            # Create new worksheet for this month
-            self.worksheet = self.sheet.add_worksheet(title=sheet_name, rows=1000, cols=10)
-            self.worksheet.append_row(self.HEADER_ROW)
-            print(f"Created new monthly worksheet: {sheet_name}")
+        return self._get_or_create_monthly_worksheet(sheet, date)
+    
+    def _read_worksheet_records(self, sheet_name: str, spreadsheet_key: Optional[str] = None) -> List[Dict]:
+        """
+        Read all records of a worksheet by name.
+        
+        Concurrent reads of the same worksheet share one pooled connection
+        and one API call, so the returned list must not be modified. Reads
+        only join a call started since the worksheet's last write, so a
+        caller always sees its own writes.
         
-        self._current_month_key = sheet_name
+        Args:
+            sheet_name: Worksheet name
+            spreadsheet_key: Spreadsheet key, or None for the shared spreadsheet
+        """
+        def read() -> List[Dict]:
+            with self.pool.connection() as conn, timed(logger, "sheets.read_records", worksheet=sheet_name):
+                try:
+                    worksheet = conn.open_spreadsheet(spreadsheet_key).worksheet(sheet_name)
+                except gspread.WorksheetNotFound:
+                    return []
+                return worksheet.get_all_records()
+        
+        worksheet_id = (spreadsheet_key or Config.GOOGLE_SHEET_NAME, sheet_name)
+        flight_key = (*worksheet_id, self._worksheet_versions.get(worksheet_id, 0), 'all_records')
+        return self._flight.do(flight_key, read)
     
-    def _reconnect(self) -> None:
-        """Reconnect to Google Sheets if connection was lost."""
-        try:
-            print("Reconnecting to Google Sheets...")
-            self._connect()
-            print("Reconnected successfully")
-        except Exception as e:
-            print(f"Failed to reconnect: {e}")
-            raise
+    def _bump_worksheet_version(self, spreadsheet_key: Optional[str], sheet_name: str) -> None:
+        """Keep later reads of a worksheet from joining a read started before a write."""
+        worksheet_id = (spreadsheet_key or Config.GOOGLE_SHEET_NAME, sheet_name)
+        with self._worksheet_versions_lock:
+            self._worksheet_versions[worksheet_id] = self._worksheet_versions.get(worksheet_id, 0) + 1
+    
+    def get_data_version(self, user_id: int) -> int:
+        """
+        Get the write counter for a user's expenses.
+        
+        The counter is bumped on every successful write, so cached
+        results derived from the user's data stay valid while it is unchanged.
+        
+        Args:
+            user_id: Telegram user ID
+            
+        Returns:
+            int: Current data version for the user
+        """
+        return self._data_versions.get(user_id, 0)
+    
+    def _bump_data_version(self, user_id: int) -> None:
+        """Invalidate cached results for a user after a write."""
+        self._data_versions[user_id] = self._data_versions.get(user_id, 0) + 1
+    
+    def _seed_recent_keys(self, worksheet: gspread.Worksheet) -> None:
+        """
+        Load idempotency keys already stored in a worksheet, once per process.
+        
+        Makes updates redelivered after a restart detectable without a lookup
+        per write. Also adds the key column header to worksheets created
+        before it existed.
+        """
+        worksheet_id = (worksheet.spreadsheet.id, worksheet.title)
+        with self._seed_lock:
+            if worksheet_id in self._seeded_worksheets:
+                return
+            
+            with timed(logger, "sheets.read_keys", worksheet=worksheet.title):
+                values = worksheet.col_values(self.KEY_COLUMN)
+            if not values or values[0] != "Key":
+                worksheet.update_cell(1, self.KEY_COLUMN, "Key")
+            self._recent_keys.update(values[1:])
+            self._seeded_worksheets.add(worksheet_id)
+    
+    def _append_expense(self, expense: ExpenseInput, verify_remote: bool) -> None:
+        """
+        Append an expense row unless its idempotency key was already written.
+        
+        Args:
+            expense: ExpenseInput object containing expense data
+            verify_remote: Look the key up in the sheet before appending; used
+                when a previous attempt may have succeeded server-side
+        """
+        key = expense.idempotency_key
+        
+        with self.pool.connection() as conn:
+            # Ensure worksheet exists for expense date (always verify, sheet could be deleted)
+            spreadsheet = self._open_spreadsheet(conn, expense.user_id)
+            worksheet = self._ensure_worksheet_for_date(spreadsheet, expense.date)
+            
+            if key:
+                self._seed_recent_keys(worksheet)
+                if key in self._recent_keys:
+                    return
+                if verify_remote:
+                    with timed(logger, "sheets.find_key", worksheet=worksheet.title):
+                        found = worksheet.find(key, in_column=self.KEY_COLUMN)
+                    if found:
+                        # The first attempt landed; index it so /undo finds it
+                        try:
+                            self.row_index.record(
+                                self.directory.get(expense.user_id), worksheet.title, [expense], [found.row]
+                            )
+                        except Exception as e:
+                            logger.warning(f"Error indexing found row in {worksheet.title}: {e}")
+                        self._recent_keys.add(key)
+                        self._bump_data_version(expense.user_id)
+                        return
+            
+            row = expense.to_sheet_row()
+            try:
+                with timed(logger, "sheets.append", worksheet=worksheet.title, rows=1):
+                    response = worksheet.append_row(row)
+            finally:
+                # A failed append may still have landed
+                self._bump_worksheet_version(self.directory.get(expense.user_id), worksheet.title)
+        
+        self._index_rows(self.directory.get(expense.user_id), worksheet.title, [expense], response)
+        self._recent_keys.add(key)
+        self._bump_data_version(expense.user_id)
     
     def add_expense(self, expense: ExpenseInput, retry: bool = True) -> bool:
         """
         Add a new expense record to the spreadsheet.
         
+        Expenses carrying an idempotency key already written are skipped
+        and reported as saved, so retries and redelivered updates are safe.
+        
         Args:
             expense: ExpenseInput object containing expense data
             retry: Whether to retry on connection error
@@ -124,83 +381,312 @@ class GoogleSheetsService:
         Returns:
             bool: True if successful, False otherwise
         """
+        if expense.idempotency_key in self._recent_keys:
+            return True
+        
         try:
-            # Ensure worksheet exists for expense date (always verify, sheet could be deleted)
-            self._ensure_worksheet_for_date(expense.date)
-            row = expense.to_sheet_row()
-            self.worksheet.append_row(row)
+            self._append_expense(expense, verify_remote=False)
+            return True
+        except Exception as e:
+            logger.error(f"Error adding expense: {e}")
+            if not (retry and is_connection_error(e)):
+                return False
+        
+        # The pool has already replaced the broken connection; the first
+        # append may still have landed, so check the sheet before writing again
+        try:
+            self._append_expense(expense, verify_remote=True)
             return True
-        except (ConnectionResetError, ConnectionError, OSError) as e:
-            print(f"Connection error adding expense: {e}")
-            if retry:
-                self._reconnect()
-                return self.add_expense(expense, retry=False)
+        except Exception as e:
+            logger.error(f"Error adding expense on retry: {e}")
+            return False
+    
+    def add_expenses(self, expenses: List[ExpenseInput]) -> int:
+        """
+        Add several expenses with one append call per monthly worksheet
+        of each user's spreadsheet.
+        
+        Expenses whose idempotency key was already written are skipped, so
+        replaying a batch is safe.
+        
+        Args:
+            expenses: ExpenseInput objects to save
+            
+        Returns:
+            int: Number of expenses saved or already present
+            
+        Raises:
+            Exception: If writing to Google Sheets fails
+        """
+        by_sheet: Dict[Tuple[Optional[str], str], List[ExpenseInput]] = {}
+        for expense in expenses:
+            target = (self.directory.get(expense.user_id), self._get_month_sheet_name(expense.date))
+            by_sheet.setdefault(target, []).append(expense)
+        
+        saved = 0
+        with self.pool.connection() as conn:
+            for (spreadsheet_key, _), batch in by_sheet.items():
+                spreadsheet = conn.open_spreadsheet(spreadsheet_key)
+                worksheet = self._ensure_worksheet_for_date(spreadsheet, batch[0].date)
+                self._seed_recent_keys(worksheet)
+                
+                new_expenses = []
+                batch_keys: Set[str] = set()
+                for expense in batch:
+                    key = expense.idempotency_key
+                    if key and (key in self._recent_keys or key in batch_keys):
+                        saved += 1
+                        continue
+                    if key:
+                        batch_keys.add(key)
+                    new_expenses.append(expense)
+                
+                if new_expenses:
+                    try:
+                        with timed(logger, "sheets.append", worksheet=worksheet.title, rows=len(new_expenses)):
+                            response = worksheet.append_rows([expense.to_sheet_row() for expense in new_expenses])
+                    finally:
+                        self._bump_worksheet_version(spreadsheet_key, worksheet.title)
+                    self._index_rows(spreadsheet_key, worksheet.title, new_expenses, response)
+                
+                self._recent_keys.update(batch_keys)
+                for expense in new_expenses:
+                    self._bump_data_version(expense.user_id)
+                saved += len(new_expenses)
+        
+        return saved
+    
+    def _index_rows(
+        self,
+        spreadsheet_key: Optional[str],
+        sheet_name: str,
+        expenses: List[ExpenseInput],
+        response: dict
+    ) -> None:
+        """Remember the rows an append wrote; the expenses are saved either way."""
+        try:
+            self.row_index.record(spreadsheet_key, sheet_name, expenses, parse_updated_rows(response))
+        except Exception as e:
+            logger.warning(f"Error indexing appended rows in {sheet_name}: {e}")
+    
+    def _locate_row(self, worksheet: gspread.Worksheet, location: RowLocation) -> Optional[int]:
+        """
+        Confirm the row of an indexed expense before changing it.
+        
+        Reads the single key cell of the indexed row. Only if the key is not
+        there, e.g. after rows were sorted or deleted by hand, is the key
+        column searched, and the index corrected.
+        
+        Returns:
+            Current row number, or None if the expense is gone from the worksheet
+        """
+        with timed(logger, "sheets.read_key_cell", worksheet=worksheet.title):
+            value = worksheet.cell(location.row, self.KEY_COLUMN).value
+        if value == location.key:
+            return location.row
+        
+        with timed(logger, "sheets.find_key", worksheet=worksheet.title):
+            found = worksheet.find(location.key, in_column=self.KEY_COLUMN)
+        if found is None:
+            return None
+        self.row_index.move(location, found.row)
+        return found.row
+    
+    def get_recent_expenses(self, user_id: int, limit: int) -> List[ExpenseInput]:
+        """
+        Get a user's most recently saved expenses from the row index.
+        
+        Args:
+            user_id: Telegram user ID
+            limit: Maximum number of expenses
+        
+        Returns:
+            List of expenses, newest first
+        """
+        return [location.to_expense() for location in self.row_index.recent(user_id, limit)]
+    
+    def delete_expense(self, user_id: int, key: str) -> bool:
+        """
+        Delete an expense row with one targeted delete_rows call.
+        
+        Args:
+            user_id: Telegram user ID
+            key: Idempotency key of the expense
+        
+        Returns:
+            bool: True if the row was deleted, False if it is not indexed,
+                no longer in the worksheet, or the call failed
+        """
+        location = self.row_index.get(user_id, key)
+        if location is None:
             return False
+        
+        try:
+            with self.row_index.lock, self.pool.connection() as conn:
+                worksheet = conn.open_spreadsheet(location.spreadsheet_key).worksheet(location.worksheet)
+                row = self._locate_row(worksheet, location)
+                if row is None:
+                    self.row_index.remove(location, shift=False)
+                    return False
+                
+                try:
+                    with timed(logger, "sheets.delete_row", worksheet=worksheet.title):
+                        worksheet.delete_rows(row)
+                finally:
+                    self._bump_worksheet_version(location.spreadsheet_key, worksheet.title)
+                self.row_index.remove(location._replace(row=row))
         except Exception as e:
-            print(f"Error adding expense: {e}")
-            if retry and "Connection" in str(e):
-                self._reconnect()
-                return self.add_expense(expense, retry=False)
+            logger.error(f"Error deleting expense: {e}")
             return False
+        
+        self._bump_data_version(user_id)
+        return True
     
-    def get_all_records(self, current_month_only: bool = True) -> List[Dict]:
+    def update_expense(self, expense: ExpenseInput) -> bool:
+        """
+        Overwrite an expense row with one targeted update call.
+        
+        The expense is identified by its user ID and idempotency key and
+        stays in its row, so its date must remain within the same month.
+        
+        Args:
+            expense: Expense with the new values
+        
+        Returns:
+            bool: True if the row was updated, False if it is not indexed,
+                no longer in the worksheet, or the call failed
+        """
+        location = self.row_index.get(expense.user_id, expense.idempotency_key)
+        if location is None:
+            return False
+        
+        try:
+            with self.row_index.lock, self.pool.connection() as conn:
+                worksheet = conn.open_spreadsheet(location.spreadsheet_key).worksheet(location.worksheet)
+                row = self._locate_row(worksheet, location)
+                if row is None:
+                    self.row_index.remove(location, shift=False)
+                    return False
+                
+                try:
+                    with timed(logger, "sheets.update_row", worksheet=worksheet.title):
+                        worksheet.update([expense.to_sheet_row()], f"A{row}")
+                finally:
+                    self._bump_worksheet_version(location.spreadsheet_key, worksheet.title)
+                self.row_index.update(expense)
+        except Exception as e:
+            logger.error(f"Error updating expense: {e}")
+            return False
+        
+        self._bump_data_version(expense.user_id)
+        return True
+    
+    def get_all_records(self, current_month_only: bool = True, user_id: Optional[int] = None) -> List[Dict]:
         """
         Fetch all expense records from the sheet.
         
         Args:
             current_month_only: If True, only get records from current month's worksheet
+            user_id: If given, read the spreadsheet this user is routed to
+                instead of the shared one
             
         Returns:
             List of dictionaries containing expense records
         """
+        spreadsheet_key = self.directory.get(user_id)
         try:
             if current_month_only:
-                self._ensure_current_month_worksheet()
-                return self.worksheet.get_all_records()
+                return self._read_worksheet_records(self._get_month_sheet_name(), spreadsheet_key)
             else:
                 # Get records from all monthly worksheets
+                with self.pool.connection() as conn, timed(logger, "sheets.list_worksheets"):
+                    sheet_names = [ws.title for ws in conn.open_spreadsheet(spreadsheet_key).worksheets()]
+                
                 all_records = []
-                for ws in self.sheet.worksheets():
+                for sheet_name in sheet_names:
                     try:
-                        records = ws.get_all_records()
+                        records = self._read_worksheet_records(sheet_name, spreadsheet_key)
                         all_records.extend(records)
                     except Exception:
                         continue
                 return all_records
         except Exception as e:
-            print(f"Error fetching records: {e}")
+            logger.error(f"Error fetching records: {e}")
             return []
     
+    def _month_sheet_names(self, start_date: datetime, end_date: datetime) -> List[str]:
+        """Get worksheet names for every month between two dates, inclusive."""
+        sheet_names = []
+        month = start_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        while month <= end_date:
+            sheet_names.append(self._get_month_sheet_name(month))
+            month = (month + timedelta(days=32)).replace(day=1)
+        return sheet_names
+    
     def get_records_by_date_range(
         self, 
         start_date: datetime, 
-        end_date: Optional[datetime] = None
+        end_date: Optional[datetime] = None,
+        user_id: Optional[int] = None
     ) -> List[Dict]:
         """
         Get expense records within a date range.
         
+        Reads only the monthly worksheets the range touches, in the
+        spreadsheet the user is routed to.
+        
         Args:
             start_date: Start of date range
             end_date: End of date range (defaults to now)
+            user_id: If given, only return this user's records
             
         Returns:
             List of expense records within the date range
+            
+        Raises:
+            Exception: If a worksheet of the range cannot be read
         """
         if end_date is None:
             end_date = datetime.now()
         
-        all_records = self.get_all_records()
-        filtered_records = []
+        return [record for _, record in self._iter_records(start_date, end_date, user_id)]
+    
+    def _iter_records(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        user_id: Optional[int]
+    ) -> Iterator[Tuple[datetime, Dict]]:
+        """
+        Yield records within a date range together with their parsed date.
+        
+        Each row's date is parsed once, so callers aggregating by date do
+        not parse it again.
+        
+        Raises:
+            Exception: If a worksheet of the range cannot be read
+        """
+        spreadsheet_key = self.directory.get(user_id)
         
-        for record in all_records:
+        for sheet_name in self._month_sheet_names(start_date, end_date):
             try:
-                record_date = datetime.strptime(record['Date'], "%Y-%m-%d %H:%M")
+                records = self._read_worksheet_records(sheet_name, spreadsheet_key)
+            except Exception as e:
+                # A partial result would look like a month without expenses
+                logger.error(f"Error fetching records: {e}")
+                raise
+            
+            for record in records:
+                if user_id is not None and record.get('User ID') != user_id:
+                    continue
+                try:
+                    # Rows are written as "%Y-%m-%d %H:%M", which
+                    # fromisoformat reads much faster than strptime
+                    record_date = datetime.fromisoformat(record['Date'])
+                except (ValueError, TypeError, KeyError):
+                    continue
                 if start_date <= record_date <= end_date:
-                    filtered_records.append(record)
-            except (ValueError, KeyError):
-                continue
-        
-        return filtered_records
+                    yield record_date, record
     
     def get_statistics(self, period: str, user_id: int) -> Dict:
         """
@@ -226,11 +712,8 @@ class GoogleSheetsService:
         else:
             return {"error": "Invalid period"}
         
-        # Get records for the period
-        records = self.get_records_by_date_range(start_date, now)
-        
-        # Filter by user_id
-        user_records = [r for r in records if r.get('User ID') == user_id]
+        # Get the user's records for the period
+        user_records = self.get_records_by_date_range(start_date, now, user_id)
         
         # Calculate statistics
         total = 0.0
@@ -253,14 +736,60 @@ class GoogleSheetsService:
             "count": len(user_records)
         }
     
-    def get_categories(self) -> List[str]:
+    def get_statistics_summary(self, user_id: int) -> Dict[str, Dict]:
+        """
+        Calculate today, week and month statistics in a single pass.
+        
+        Reads each worksheet the periods touch once instead of once per period.
+        
+        Args:
+            user_id: Telegram user ID to filter by
+            
+        Returns:
+            Dictionary mapping period name to total, category breakdown and count
+            
+        Raises:
+            Exception: If a worksheet cannot be read; an incomplete summary
+                must not be shown or cached
+        """
+        now = datetime.now()
+        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        week_start = today_start - timedelta(days=now.weekday())
+        
+        periods = (('today', today_start), ('week', week_start), ('month', month_start))
+        summary = {
+            period: {"period": period, "total": 0.0, "by_category": {}, "count": 0}
+            for period, _ in periods
+        }
+        
+        for record_date, record in self._iter_records(min(week_start, month_start), now, user_id):
+            try:
+                amount = float(record.get('Amount', 0))
+            except (ValueError, TypeError):
+                continue
+            category = record.get('Category', 'other')
+            
+            for period, start_date in periods:
+                if record_date >= start_date:
+                    stats = summary[period]
+                    stats["total"] += amount
+                    stats["by_category"][category] = stats["by_category"].get(category, 0) + amount
+                    stats["count"] += 1
+        
+        return summary
+    
+    def get_categories(self, user_id: Optional[int] = None) -> List[str]:
         """
         Get list of unique categories from all records.
         
+        Args:
+            user_id: If given, read the spreadsheet this user is routed to
+        
         Returns:
             List of category names
         """
-        records = self.get_all_records()
+        records = self.get_all_records(user_id=user_id)
         categories = set()
         
         for record in records:
@@ -3,23 +3,56 @@ Message and command handlers for the Expense Tracker Bot.
 Handles user interactions and bot commands.
 """
 
-from aiogram import Router, F
-from aiogram.filters import Command
-from aiogram.types import Message
+import asyncio
+import logging
+
+from aiogram import Bot, Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import BufferedInputFile, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from typing import Optional
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 
+from budgets import BudgetAlert, create_budget_store
 from config import Config
-from validators import ExpenseInput, ParsedMessage
-from google_service import GoogleSheetsService
+from recurring import RecurringRule, RecurringScheduler, create_recurring_store
+from validators import ExpenseInput, ParsedMessage, RecurringRuleInput
+from storage import create_storage, get_sheets_service
+from tenants import parse_spreadsheet_key
+from idempotency import make_idempotency_key
+from profiling import SamplingProfiler
+from formatters import (
+    EDIT_USAGE, RECURRING_USAGE, StatsCache, render_budget_alert, render_budgets, render_expense_line,
+    render_help_text, render_recent_expenses, render_recurring_rule, render_recurring_rules,
+    render_recurring_saved, render_start_text, render_stats
+)
+
 
+logger = logging.getLogger(__name__)
 
 # Initialize router
 router = Router()
 
-# Initialize Google Sheets service
-sheets_service = GoogleSheetsService()
+# Initialize expense storage (Google Sheets, SQLite or both)
+storage = create_storage()
+
+# Google Sheets service behind the storage, None for local-only storage
+sheets_service = get_sheets_service(storage)
+
+# Cache of rendered /stats messages
+stats_cache = StatsCache()
+
+# Local budgets and running month totals
+budget_store = create_budget_store()
+
+# Recurring expense rules and their scheduler
+recurring_store = create_recurring_store()
+recurring_scheduler = RecurringScheduler(recurring_store, storage)
+
+
+# Only one profiling window runs at a time
+profile_lock = asyncio.Lock()
 
 
 class ExpenseStates(StatesGroup):
@@ -27,17 +60,24 @@ class ExpenseStates(StatesGroup):
     waiting_for_category = State()
 
 
-def is_user_allowed(user_id: int) -> bool:
+async def notify_budget_alerts(message: Message, expense: ExpenseInput) -> None:
     """
-    Check if user is in the whitelist.
+    Add a saved expense to the running budget totals and send any alerts.
+    
+    Uses only the local budget store, so no Google Sheets calls are made.
     
     Args:
-        user_id: Telegram user ID
-        
-    Returns:
-        bool: True if user is allowed, False otherwise
+        message: Message the expense came from
+        expense: Saved expense
     """
-    return user_id in Config.ALLOWED_USERS
+    try:
+        alerts = await asyncio.to_thread(budget_store.record_expense, expense)
+    except Exception as e:
+        logger.error(f"Error updating budget totals: {e}")
+        return
+    
+    for alert in alerts:
+        await message.answer(render_budget_alert(alert), parse_mode="HTML")
 
 
 @router.message(Command("start"))
@@ -48,29 +88,7 @@ async def cmd_start(message: Message) -> None:
     Args:
         message: Incoming message object
     """
-    if not is_user_allowed(message.from_user.id):
-        return
-    
-    welcome_text = (
-        "👋 <b>Welcome to Expense Tracker Bot!</b>\n\n"
-        "I'll help you track your expenses and save them to Google Sheets.\n\n"
-        "<b>How to add an expense:</b>\n"
-        "Send a message in this format:\n"
-        "<code>category amount comment</code>\n\n"
-        "<b>Examples:</b>\n"
-        "• <code>food 2500 coffee at Starbucks</code>\n"
-        "• <code>transport 500 taxi</code>\n"
-        "• <code>24.12 shopping 15000 new shoes</code> (with date)\n\n"
-        "You can also send just a number, and I'll ask for the category.\n\n"
-        "<b>Available commands:</b>\n"
-        "/start - Show this message\n"
-        "/stats - View your statistics\n"
-        "/categories - List all categories\n"
-        "/help - Get help\n\n"
-        "Let's start tracking! 💰"
-    )
-    
-    await message.answer(welcome_text, parse_mode="HTML")
+    await message.answer(render_start_text(), parse_mode="HTML")
 
 
 @router.message(Command("help"))
@@ -81,30 +99,7 @@ async def cmd_help(message: Message) -> None:
     Args:
         message: Incoming message object
     """
-    if not is_user_allowed(message.from_user.id):
-        return
-    
-    help_text = (
-        "📖 <b>How to use Expense Tracker Bot</b>\n\n"
-        "<b>Adding expenses:</b>\n"
-        "Format: <code>category amount comment</code>\n\n"
-        "<b>With date:</b>\n"
-        "Format: <code>DD.MM category amount comment</code>\n\n"
-        "<b>Examples:</b>\n"
-        "✅ <code>food 2500 lunch</code>\n"
-        "✅ <code>transport 300</code>\n"
-        "✅ <code>24.12 food 500 coffee</code> (with date)\n"
-        "✅ <code>2500</code> (I'll ask for category)\n\n"
-        "<b>Common categories:</b>\n"
-        "food, transport, entertainment, shopping, health, utilities, education, other\n\n"
-        "<b>Commands:</b>\n"
-        "/stats - View statistics (today/week/month)\n"
-        "/categories - See all your categories\n"
-        "/help - Show this help message\n\n"
-        "All your expenses are automatically saved to Google Sheets! 📊"
-    )
-    
-    await message.answer(help_text, parse_mode="HTML")
+    await message.answer(render_help_text(), parse_mode="HTML")
 
 
 @router.message(Command("categories"))
@@ -115,11 +110,8 @@ async def cmd_categories(message: Message) -> None:
     Args:
         message: Incoming message object
     """
-    if not is_user_allowed(message.from_user.id):
-        return
-    
     try:
-        categories = sheets_service.get_categories()
+        categories = await asyncio.to_thread(storage.get_categories, message.from_user.id)
         
         if categories:
             categories_text = "📂 <b>Available categories:</b>\n\n"
@@ -146,55 +138,401 @@ async def cmd_stats(message: Message) -> None:
     Args:
         message: Incoming message object
     """
-    if not is_user_allowed(message.from_user.id):
+    user_id = message.from_user.id
+    
+    try:
+        # Serve the cached message while the user has no new writes
+        version = storage.get_data_version(user_id)
+        stats_text = stats_cache.get(user_id, version)
+        
+        if stats_text is None:
+            summary = await asyncio.to_thread(storage.get_statistics_summary, user_id)
+            stats_text = render_stats(summary)
+            stats_cache.put(user_id, version, stats_text)
+        
+        await message.answer(stats_text, parse_mode="HTML")
+        
+    except Exception as e:
+        await message.answer(
+            "❌ Error fetching statistics. Please try again later.",
+            parse_mode="HTML"
+        )
+
+
+@router.message(Command("budget"))
+async def cmd_budget(message: Message, command: CommandObject) -> None:
+    """
+    Handle /budget command.
+    
+    Usage:
+        /budget - list budgets with spending this month
+        /budget category amount - set a monthly budget
+        /budget category off - remove a budget
+    
+    Args:
+        message: Incoming message object
+        command: Parsed command with arguments
+    """
+    user_id = message.from_user.id
+    args = (command.args or "").split()
+    usage = (
+        "Use: <code>/budget category amount</code>\n"
+        "Example: <code>/budget food 50000</code>\n"
+        "Remove: <code>/budget food off</code>"
+    )
+    
+    try:
+        if not args:
+            budgets = await asyncio.to_thread(budget_store.get_budgets, user_id)
+            await message.answer(render_budgets(budgets), parse_mode="HTML")
+            return
+        
+        if len(args) != 2:
+            await message.answer(f"❌ Invalid format.\n\n{usage}", parse_mode="HTML")
+            return
+        
+        category = args[0].strip().lower()
+        
+        if args[1].lower() in ("off", "remove"):
+            removed = await asyncio.to_thread(budget_store.remove_budget, user_id, category)
+            text = f"🗑 Budget for <b>{category}</b> removed." if removed else f"No budget set for <b>{category}</b>."
+            await message.answer(text, parse_mode="HTML")
+            return
+        
+        try:
+            limit = float(args[1])
+        except ValueError:
+            limit = 0
+        if limit <= 0:
+            await message.answer(f"❌ Invalid amount: {args[1]}\n\n{usage}", parse_mode="HTML")
+            return
+        
+        # Seed this month's running total once; later expenses update it locally.
+        # A failed read raises, so the total is never seeded from partial data
+        now = datetime.now()
+        records = None
+        if await asyncio.to_thread(budget_store.get_month_total, user_id, category, now) is None:
+            month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            records = await asyncio.to_thread(storage.get_records_by_date_range, month_start, now, user_id)
+        spent = await asyncio.to_thread(budget_store.set_budget, user_id, category, limit, records)
+        
+        await message.answer(
+            f"✅ Budget set!\n\n"
+            f"Category: <b>{category}</b>\n"
+            f"Monthly limit: <b>{limit:.2f}</b>\n"
+            f"Spent this month: <b>{spent:.2f}</b>",
+            parse_mode="HTML"
+        )
+    
+    except Exception as e:
+        await message.answer(
+            "❌ Error updating budgets. Please try again later.",
+            parse_mode="HTML"
+        )
+
+
+@router.message(Command("sheet"))
+async def cmd_sheet(message: Message, command: CommandObject) -> None:
+    """
+    Handle /sheet command.
+    
+    Usage:
+        /sheet - show which spreadsheet the user's expenses go to
+        /sheet URL_OR_KEY - use the user's own spreadsheet
+        /sheet default - go back to the shared spreadsheet
+    
+    Args:
+        message: Incoming message object
+        command: Parsed command with arguments
+    """
+    if sheets_service is None:
+        await message.answer("Personal spreadsheets need Google Sheets storage.")
         return
     
     user_id = message.from_user.id
+    arg = (command.args or "").strip()
     
     try:
-        # Get statistics for different periods
-        today_stats = sheets_service.get_statistics('today', user_id)
-        week_stats = sheets_service.get_statistics('week', user_id)
-        month_stats = sheets_service.get_statistics('month', user_id)
-        
-        stats_text = "📊 <b>Your Expense Statistics</b>\n\n"
-        
-        # Today
-        stats_text += f"<b>📅 Today:</b>\n"
-        stats_text += f"Total: <b>{today_stats['total']:.2f}</b> ({today_stats['count']} expenses)\n"
-        if today_stats['by_category']:
-            for cat, amount in sorted(today_stats['by_category'].items(), key=lambda x: x[1], reverse=True):
-                stats_text += f"  • {cat}: {amount:.2f}\n"
-        else:
-            stats_text += "  No expenses yet\n"
+        if not arg:
+            key = sheets_service.directory.get(user_id)
+            if key is None:
+                text = f"📄 Your expenses go to the shared spreadsheet <b>{Config.GOOGLE_SHEET_NAME}</b>."
+            else:
+                text = f"📄 Your expenses go to https://docs.google.com/spreadsheets/d/{key}"
+            await message.answer(
+                f"{text}\n\n"
+                "Use your own: <code>/sheet SPREADSHEET_LINK</code>\n"
+                "Back to shared: <code>/sheet default</code>",
+                parse_mode="HTML"
+            )
+            return
         
-        stats_text += "\n"
+        if arg.lower() == "default":
+            await asyncio.to_thread(sheets_service.unroute_user, user_id)
+            await message.answer(
+                f"✅ Your expenses now go to the shared spreadsheet <b>{Config.GOOGLE_SHEET_NAME}</b>.",
+                parse_mode="HTML"
+            )
+            return
         
-        # This week
-        stats_text += f"<b>📆 This Week:</b>\n"
-        stats_text += f"Total: <b>{week_stats['total']:.2f}</b> ({week_stats['count']} expenses)\n"
-        if week_stats['by_category']:
-            for cat, amount in sorted(week_stats['by_category'].items(), key=lambda x: x[1], reverse=True):
-                stats_text += f"  • {cat}: {amount:.2f}\n"
-        else:
-            stats_text += "  No expenses yet\n"
+        try:
+            key = parse_spreadsheet_key(arg)
+        except ValueError as e:
+            await message.answer(f"❌ {str(e)}")
+            return
         
-        stats_text += "\n"
+        try:
+            title = await asyncio.to_thread(sheets_service.route_user, user_id, key)
+        except Exception as e:
+            email = await asyncio.to_thread(sheets_service.get_service_account_email)
+            await message.answer(
+                "❌ Cannot open this spreadsheet.\n\n"
+                f"Share it with <code>{email}</code> as an editor and try again.",
+                parse_mode="HTML"
+            )
+            return
         
-        # This month
-        stats_text += f"<b>📈 This Month:</b>\n"
-        stats_text += f"Total: <b>{month_stats['total']:.2f}</b> ({month_stats['count']} expenses)\n"
-        if month_stats['by_category']:
-            for cat, amount in sorted(month_stats['by_category'].items(), key=lambda x: x[1], reverse=True):
-                stats_text += f"  • {cat}: {amount:.2f}\n"
-        else:
-            stats_text += "  No expenses yet\n"
+        await message.answer(
+            f"✅ Your expenses now go to <b>{title}</b>.\n"
+            "Earlier expenses stay in the previous spreadsheet.",
+            parse_mode="HTML"
+        )
+    
+    except Exception as e:
+        await message.answer(
+            "❌ Error updating your spreadsheet. Please try again later.",
+            parse_mode="HTML"
+        )
+
+
+@router.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject) -> None:
+    """
+    Handle /profile command (admins only).
+    
+    Samples the stacks of the event loop and worker threads for a number of
+    seconds and replies with a collapsed-stack file for flame graph tools.
+    
+    Usage:
+        /profile [seconds]
+    
+    Args:
+        message: Incoming message object
+        command: Parsed command with arguments
+    """
+    if message.from_user.id not in Config.ADMIN_USERS:
+        return
+    
+    arg = (command.args or "").strip()
+    seconds = int(arg) if arg.isdigit() else 10
+    seconds = max(1, min(seconds, Config.PROFILE_MAX_SECONDS))
+    
+    if profile_lock.locked():
+        await message.answer("⏳ A profiling session is already running.")
+        return
+    
+    async with profile_lock:
+        await message.answer(f"🔬 Profiling for {seconds} s...")
+        profiler = SamplingProfiler(Config.PROFILE_SAMPLE_INTERVAL)
+        await asyncio.to_thread(profiler.run, seconds)
+    
+    filename = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.folded"
+    await message.answer_document(
+        BufferedInputFile(profiler.collapsed().encode("utf-8"), filename=filename),
+        caption=(
+            f"{profiler.samples} samples over {seconds} s.\n"
+            "Open with speedscope.app or flamegraph.pl."
+        )
+    )
+
+
+async def announce_recurring_expenses(
+    bot: Bot,
+    items: List[Tuple[RecurringRule, ExpenseInput]]
+) -> None:
+    """
+    Notify chats about materialized recurring expenses and check budgets.
+    
+    Args:
+        bot: Bot instance used to send messages
+        items: Pairs of rule and saved expense
+    """
+    by_chat: Dict[int, List[ExpenseInput]] = {}
+    for rule, expense in items:
+        by_chat.setdefault(rule.chat_id, []).append(expense)
+    
+    # Count every saved expense before sending anything, so a chat that
+    # cannot be messaged does not leave budget totals behind
+    alerts_by_chat: Dict[int, List[BudgetAlert]] = {}
+    for chat_id, expenses in by_chat.items():
+        for expense in expenses:
+            try:
+                alerts = await asyncio.to_thread(budget_store.record_expense, expense)
+            except Exception as e:
+                logger.error(f"Error updating budget totals: {e}")
+                continue
+            alerts_by_chat.setdefault(chat_id, []).extend(alerts)
+    
+    for chat_id, expenses in by_chat.items():
+        try:
+            await bot.send_message(chat_id, render_recurring_saved(expenses), parse_mode="HTML")
+            for alert in alerts_by_chat.get(chat_id, []):
+                await bot.send_message(chat_id, render_budget_alert(alert), parse_mode="HTML")
+        except Exception as e:
+            logger.warning(f"Failed to notify chat {chat_id} about recurring expenses: {e}")
+
+
+@router.message(Command("recurring"))
+async def cmd_recurring(message: Message, command: CommandObject) -> None:
+    """
+    Handle /recurring command.
+    
+    Usage:
+        /recurring - list recurring expenses
+        /recurring add FREQUENCY [DAY] category amount [comment] - add a rule
+        /recurring remove ID - remove a rule
+    
+    Args:
+        message: Incoming message object
+        command: Parsed command with arguments
+    """
+    user_id = message.from_user.id
+    action, _, rest = (command.args or "").strip().partition(" ")
+    action = action.lower()
+    
+    try:
+        if not action:
+            rules = await asyncio.to_thread(recurring_store.get_user_rules, user_id)
+            await message.answer(render_recurring_rules(rules), parse_mode="HTML")
+            return
         
-        await message.answer(stats_text, parse_mode="HTML")
+        if action == "add":
+            rule_input = RecurringRuleInput.parse_from_args(rest)
+            rule = await asyncio.to_thread(recurring_store.add_rule, user_id, message.chat.id, rule_input)
+            recurring_scheduler.schedule(rule)
+            await message.answer(
+                f"✅ Recurring expense added!\n\n{render_recurring_rule(rule)}",
+                parse_mode="HTML"
+            )
+            return
+        
+        if action == "remove" and rest.strip().lstrip("#").isdigit():
+            rule_id = int(rest.strip().lstrip("#"))
+            removed = await asyncio.to_thread(recurring_store.remove_rule, user_id, rule_id)
+            if removed:
+                recurring_scheduler.unschedule(rule_id)
+                await message.answer(f"🗑 Recurring expense #{rule_id} removed.")
+            else:
+                await message.answer(f"No recurring expense #{rule_id}.")
+            return
         
+        await message.answer(f"❌ Invalid format.\n\n{RECURRING_USAGE}", parse_mode="HTML")
+    
+    except ValueError as e:
+        await message.answer(f"❌ {str(e)}\n\n{RECURRING_USAGE}", parse_mode="HTML")
     except Exception as e:
         await message.answer(
-            "❌ Error fetching statistics. Please try again later.",
+            "❌ Error updating recurring expenses. Please try again later.",
+            parse_mode="HTML"
+        )
+
+
+@router.message(Command("undo"))
+async def cmd_undo(message: Message) -> None:
+    """
+    Handle /undo command: delete the user's last saved expense.
+    
+    Args:
+        message: Incoming message object
+    """
+    user_id = message.from_user.id
+    
+    try:
+        recent = await asyncio.to_thread(storage.get_recent_expenses, user_id, 1)
+        if not recent:
+            await message.answer("Nothing to undo.")
+            return
+        
+        expense = recent[0]
+        deleted = await asyncio.to_thread(storage.delete_expense, user_id, expense.idempotency_key)
+        if not deleted:
+            await message.answer("❌ Could not remove the expense. It may have been changed in the spreadsheet.")
+            return
+        
+        await asyncio.to_thread(budget_store.forget_expense, expense)
+        await message.answer(f"↩️ Removed: {render_expense_line(expense)}", parse_mode="HTML")
+    
+    except Exception as e:
+        await message.answer(
+            "❌ Error removing the expense. Please try again later.",
+            parse_mode="HTML"
+        )
+
+
+@router.message(Command("edit"))
+async def cmd_edit(message: Message, command: CommandObject) -> None:
+    """
+    Handle /edit command.
+    
+    Usage:
+        /edit - list recent expenses
+        /edit [#N] category amount [comment] - replace the last (or N-th
+            most recent) expense, keeping its date unless one is given
+    
+    Args:
+        message: Incoming message object
+        command: Parsed command with arguments
+    """
+    user_id = message.from_user.id
+    args = (command.args or "").strip()
+    
+    try:
+        recent = await asyncio.to_thread(storage.get_recent_expenses, user_id, Config.EDIT_HISTORY_SIZE)
+        if not args:
+            await message.answer(render_recent_expenses(recent), parse_mode="HTML")
+            return
+        
+        number = 1
+        first, _, rest = args.partition(" ")
+        if first.startswith("#") and first[1:].isdigit():
+            number, args = int(first[1:]), rest
+        if not 1 <= number <= len(recent):
+            await message.answer(f"No recent expense #{number}.\n\n{render_recent_expenses(recent)}", parse_mode="HTML")
+            return
+        
+        old = recent[number - 1]
+        parsed = ParsedMessage.parse_from_text(args)
+        if parsed.category is None:
+            raise ValueError("Category and amount are required")
+        
+        # The row stays in its monthly worksheet, so the month cannot change
+        date = parsed.date or old.date
+        if (date.year, date.month) != (old.date.year, old.date.month):
+            raise ValueError("The date must stay in the same month. Use /undo and add the expense again")
+        
+        expense = ExpenseInput.validate(
+            category=parsed.category,
+            amount=parsed.amount,
+            comment=parsed.comment,
+            user_id=user_id,
+            date=date,
+            idempotency_key=old.idempotency_key
+        )
+        
+        updated = await asyncio.to_thread(storage.update_expense, expense)
+        if not updated:
+            await message.answer("❌ Could not update the expense. It may have been changed in the spreadsheet.")
+            return
+        
+        await asyncio.to_thread(budget_store.forget_expense, old)
+        await message.answer(f"✏️ Updated: {render_expense_line(expense)}", parse_mode="HTML")
+        await notify_budget_alerts(message, expense)
+    
+    except ValueError as e:
+        await message.answer(f"❌ {str(e)}\n\n{EDIT_USAGE}", parse_mode="HTML")
+    except Exception as e:
+        await message.answer(
+            "❌ Error updating the expense. Please try again later.",
             parse_mode="HTML"
         )
 
@@ -208,9 +546,6 @@ async def process_category(message: Message, state: FSMContext) -> None:
         message: Incoming message object
         state: FSM context
     """
-    if not is_user_allowed(message.from_user.id):
-        return
-    
     category = message.text.strip().lower()
     
     # Get stored amount from state
@@ -223,16 +558,17 @@ async def process_category(message: Message, state: FSMContext) -> None:
         return
     
     try:
-        # Create expense record
-        expense = ExpenseInput(
+        # Create expense record (the only validation it gets)
+        expense = ExpenseInput.validate(
             category=category,
             amount=amount,
             comment="",
-            user_id=message.from_user.id
+            user_id=message.from_user.id,
+            idempotency_key=make_idempotency_key(message.chat.id, message.message_id)
         )
         
-        # Save to Google Sheets
-        success = sheets_service.add_expense(expense)
+        # Save expense
+        success = await asyncio.to_thread(storage.add_expense, expense)
         
         if success:
             await message.answer(
@@ -241,6 +577,7 @@ async def process_category(message: Message, state: FSMContext) -> None:
                 f"Amount: <b>{expense.amount:.2f}</b>",
                 parse_mode="HTML"
             )
+            await notify_budget_alerts(message, expense)
         else:
             await message.answer("❌ Failed to save expense. Please try again.")
         
@@ -264,9 +601,6 @@ async def process_expense(message: Message, state: FSMContext) -> None:
         message: Incoming message object
         state: FSM context
     """
-    if not is_user_allowed(message.from_user.id):
-        return
-    
     try:
         # Parse the message
         parsed = ParsedMessage.parse_from_text(message.text)
@@ -293,15 +627,16 @@ async def process_expense(message: Message, state: FSMContext) -> None:
                 'category': parsed.category,
                 'amount': parsed.amount,
                 'comment': parsed.comment,
-                'user_id': message.from_user.id
+                'user_id': message.from_user.id,
+                'idempotency_key': make_idempotency_key(message.chat.id, message.message_id)
             }
             if expense_date:
                 expense_kwargs['date'] = expense_date
             
-            expense = ExpenseInput(**expense_kwargs)
+            expense = ExpenseInput.validate(**expense_kwargs)
             
-            # Save to Google Sheets
-            success = sheets_service.add_expense(expense)
+            # Save expense
+            success = await asyncio.to_thread(storage.add_expense, expense)
             
             if success:
                 response = (
@@ -315,6 +650,7 @@ async def process_expense(message: Message, state: FSMContext) -> None:
                     response += f"\nComment: {expense.comment}"
                 
                 await message.answer(response, parse_mode="HTML")
+                await notify_budget_alerts(message, expense)
             else:
                 await message.answer("❌ Failed to save expense. Please try again.")
         else:
@@ -0,0 +1,79 @@
+"""
+Idempotency module.
+Tracks recently written expense keys so retried or redelivered writes are skipped.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+
+def make_idempotency_key(chat_id: int, message_id: int) -> str:
+    """
+    Build the idempotency key for an expense sent in a Telegram message.
+    
+    Args:
+        chat_id: Telegram chat ID
+        message_id: Telegram message ID within the chat
+    
+    Returns:
+        Key in the form "chat_id:message_id"
+    """
+    return f"{chat_id}:{message_id}"
+
+
+class RecentKeys:
+    """
+    Thread-safe bounded set of recently written idempotency keys.
+    
+    Keeps the most recently added keys and evicts the oldest ones once
+    max_size is reached.
+    """
+    
+    def __init__(self, max_size: int = 10000):
+        """
+        Initialize an empty key set.
+        
+        Args:
+            max_size: Maximum number of keys kept
+        """
+        self.max_size = max_size
+        self._keys: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __contains__(self, key: Optional[str]) -> bool:
+        """Check whether a key was written recently."""
+        if not key:
+            return False
+        with self._lock:
+            return key in self._keys
+    
+    def __len__(self) -> int:
+        """Number of keys currently kept."""
+        return len(self._keys)
+    
+    def add(self, key: Optional[str]) -> None:
+        """
+        Remember a written key.
+        
+        Args:
+            key: Idempotency key; empty keys are ignored
+        """
+        if key:
+            self.update([key])
+    
+    def update(self, keys: Iterable[str]) -> None:
+        """
+        Remember several written keys at once.
+        
+        Args:
+            keys: Idempotency keys; empty keys are ignored
+        """
+        with self._lock:
+            for key in keys:
+                if not key:
+                    continue
+                self._keys[key] = None
+                self._keys.move_to_end(key)
+            while len(self._keys) > self.max_size:
+                self._keys.popitem(last=False)
@@ -0,0 +1,150 @@
+"""
+Profiling module for the Expense Tracker Bot.
+Provides an on-demand sampling profiler producing flame-graph input and a
+watchdog reporting callbacks that block the event loop.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from types import FrameType
+from typing import List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_label(frame: FrameType) -> str:
+    """Describe a frame as 'function (file:line)'."""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse_stack(frame: Optional[FrameType]) -> List[str]:
+    """Get frame labels of a stack from the outermost call inwards."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for all threads of the process.
+    
+    The thread calling run() snapshots every other thread's stack at a
+    fixed interval, so the event loop and the worker threads running Sheets
+    calls are covered without instrumenting any code. Nothing runs outside
+    of a profiling window. Results use the collapsed-stack format read by
+    flamegraph.pl and speedscope: one 'thread;outer;...;inner count' line
+    per stack.
+    """
+    
+    def __init__(self, interval: float = 0.005):
+        """
+        Initialize the profiler.
+        
+        Args:
+            interval: Seconds between samples
+        """
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+    
+    def run(self, duration: float) -> None:
+        """
+        Sample all threads for a period, blocking the calling thread.
+        
+        Args:
+            duration: Seconds to sample for
+        """
+        own_thread = threading.get_ident()
+        deadline = time.monotonic() + duration
+        
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = [names.get(thread_id, str(thread_id)), *_collapse_stack(frame)]
+                self.stacks[";".join(stack)] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+    
+    def collapsed(self) -> str:
+        """
+        Render samples in collapsed-stack format.
+        
+        Returns:
+            Text with one stack per line, most frequent first
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class LoopWatchdog:
+    """
+    Detect callbacks blocking the event loop.
+    
+    A heartbeat task records the time on every loop iteration it gets; a
+    monitor thread logs a warning with the loop thread's current stack when
+    the heartbeat is late by more than the threshold, and the total stall
+    once the loop recovers. Unlike asyncio debug mode it adds no overhead to
+    other callbacks, and nothing runs unless the watchdog is started.
+    """
+    
+    def __init__(self, threshold: float):
+        """
+        Initialize the watchdog.
+        
+        Args:
+            threshold: Seconds the loop may be blocked before it is reported
+        """
+        self.threshold = threshold
+        self._last_beat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._stopped = threading.Event()
+    
+    def _monitor(self) -> None:
+        """Watch the heartbeat from a separate thread."""
+        stalled_since: Optional[float] = None
+        
+        while not self._stopped.wait(self.threshold / 2):
+            last_beat = self._last_beat
+            late = time.monotonic() - last_beat
+            
+            if late > self.threshold and stalled_since != last_beat:
+                stalled_since = last_beat
+                frame = sys._current_frames().get(self._loop_thread)
+                stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+                logger.warning(
+                    f"Event loop blocked for {late * 1000:.0f} ms",
+                    extra={"blocked_ms": round(late * 1000), "stack": stack}
+                )
+            elif stalled_since is not None and last_beat != stalled_since:
+                logger.warning(
+                    f"Event loop unblocked after {(last_beat - stalled_since) * 1000:.0f} ms",
+                    extra={"blocked_ms": round((last_beat - stalled_since) * 1000)}
+                )
+                stalled_since = None
+    
+    async def run(self) -> None:
+        """Run the heartbeat on the current loop until cancelled."""
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        monitor = threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True)
+        monitor.start()
+        
+        try:
+            while True:
+                self._last_beat = time.monotonic()
+                await asyncio.sleep(self.threshold / 4)
+        finally:
+            self._stopped.set()
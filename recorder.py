@@ -0,0 +1,193 @@
+"""
+Update recording module.
+Writes incoming Telegram updates, anonymized, to a JSONL file that
+replay.py can play back against the dispatcher.
+"""
+
+import hashlib
+import json
+import logging
+import queue
+import secrets
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from config import Config
+
+
+logger = logging.getLogger(__name__)
+
+# Personal fields removed from every recorded object (users, chats,
+# shared contacts, forward origins)
+PERSONAL_FIELDS = frozenset({
+    "last_name", "username", "vcard", "bio", "photo",
+    "active_usernames", "description", "invite_link"
+})
+
+# Required personal fields replaced with placeholders, so replays still parse
+NAME_PLACEHOLDERS = {
+    "first_name": "User", "title": "Chat", "sender_user_name": "User", "phone_number": "0"
+}
+
+# Fields holding a user ID outside a user object
+USER_ID_FIELDS = frozenset({"user_id"})
+
+
+def anonymize_id(value: int, salt: str) -> int:
+    """
+    Replace a user or chat ID with a stable pseudonym.
+    
+    The same ID always maps to the same pseudonym for a salt, so a private
+    chat keeps the ID of its user, and group chat IDs stay negative.
+    
+    Args:
+        value: Telegram user or chat ID
+        salt: Secret salt of the recording
+    
+    Returns:
+        Pseudonymous ID
+    """
+    digest = hashlib.sha256(f"{salt}:{abs(value)}".encode()).hexdigest()
+    pseudonym = int(digest[:12], 16)
+    return -pseudonym if value < 0 else pseudonym
+
+
+def anonymize_update(data: Any, salt: str) -> Any:
+    """
+    Anonymize a serialized update.
+    
+    Personal fields are removed and names replaced with placeholders on
+    every object, so shared contacts and forward origins are scrubbed too.
+    User and chat IDs, including 'user_id' references, get pseudonymous
+    IDs; message text is kept, because replays need it.
+    
+    Args:
+        data: Update serialized to JSON-compatible types
+        salt: Secret salt of the recording
+    
+    Returns:
+        Anonymized copy of the data
+    """
+    if isinstance(data, list):
+        return [anonymize_update(item, salt) for item in data]
+    if not isinstance(data, dict):
+        return data
+    
+    is_user_or_chat = "id" in data and ("is_bot" in data or "type" in data)
+    result = {}
+    for key, value in data.items():
+        if key in PERSONAL_FIELDS:
+            continue
+        if key in NAME_PLACEHOLDERS:
+            result[key] = NAME_PLACEHOLDERS[key]
+        elif (is_user_or_chat and key == "id") or (key in USER_ID_FIELDS and isinstance(value, int)):
+            result[key] = anonymize_id(value, salt)
+        else:
+            result[key] = anonymize_update(value, salt)
+    return result
+
+
+def read_recording(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read recorded updates.
+    
+    Args:
+        path: JSONL recording path
+    
+    Yields:
+        Entries with 't' (Unix time), 'session' (ID of the bot run that
+        recorded it), 'allowed' and 'update'
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class UpdateRecorder(BaseMiddleware):
+    """
+    Outer update middleware appending every update to a JSONL file.
+    
+    Updates are serialized and anonymized on the event loop, then written by
+    a background thread, so recording adds no blocking file I/O to handling.
+    Each entry also notes whether the user was whitelisted at the time, so a
+    replay can reproduce both served traffic and dropped spam. The file is
+    appended to across restarts; entries carry the wall-clock time and an
+    ID of the bot run, so replays can time each run separately.
+    """
+    
+    def __init__(self, path: str, salt: Optional[str] = None):
+        """
+        Open the recording file and start the writer thread.
+        
+        Args:
+            path: JSONL file updates are appended to
+            salt: Salt for ID pseudonyms; random per process if not given
+        """
+        self.path = path
+        self.salt = salt or secrets.token_hex(16)
+        self.session = secrets.token_hex(4)
+        self._queue: "queue.SimpleQueue[Optional[str]]" = queue.SimpleQueue()
+        self._file = open(path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._write_loop, name="update-recorder", daemon=True)
+        self._thread.start()
+    
+    def _write_loop(self) -> None:
+        """Write queued lines until the closing sentinel arrives."""
+        while True:
+            line = self._queue.get()
+            if line is None:
+                break
+            self._file.write(line)
+            self._file.flush()
+        self._file.close()
+    
+    def record(self, update: Update, allowed: bool) -> None:
+        """
+        Queue an update for writing.
+        
+        Args:
+            update: Incoming update
+            allowed: Whether the sender is whitelisted
+        """
+        entry = {
+            "t": round(time.time(), 3),
+            "session": self.session,
+            "allowed": allowed,
+            "update": anonymize_update(update.model_dump(mode="json", by_alias=True, exclude_none=True), self.salt)
+        }
+        self._queue.put(json.dumps(entry, ensure_ascii=False) + "\n")
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        """
+        Record the update and pass it on unchanged.
+        
+        Args:
+            handler: Next handler in chain
+            event: Incoming update
+            data: Additional data
+        
+        Returns:
+            Result of handler
+        """
+        if isinstance(event, Update):
+            user = data.get("event_from_user")
+            try:
+                self.record(event, user is not None and user.id in Config.ALLOWED_USERS)
+            except Exception as e:
+                logger.warning(f"Failed to record update: {e}")
+        return await handler(event, data)
+    
+    def close(self) -> None:
+        """Flush pending updates and close the file."""
+        self._queue.put(None)
+        self._thread.join()
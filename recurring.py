@@ -0,0 +1,346 @@
+"""
+Recurring expenses module.
+Stores recurring expense rules locally and materializes due occurrences
+for all users from a single scheduler task.
+"""
+
+import asyncio
+import calendar
+import heapq
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Tuple
+
+from config import Config
+from sqlite_storage import LocalDatabase
+from storage import ExpenseStorage
+from validators import ExpenseInput, RecurringRuleInput
+
+
+logger = logging.getLogger(__name__)
+
+
+class RecurringRule(NamedTuple):
+    """Stored recurring expense rule."""
+    
+    id: int
+    user_id: int
+    chat_id: int
+    frequency: str
+    day: int
+    category: str
+    amount: float
+    comment: str
+    next_run: date
+
+
+def first_occurrence(frequency: str, day: int, start: date) -> date:
+    """
+    Get the first occurrence of a rule on or after a date.
+    
+    Args:
+        frequency: 'daily', 'weekly' or 'monthly'
+        day: Weekday (0 = Monday) for weekly rules, day of month for monthly rules
+        start: Earliest allowed date
+    
+    Returns:
+        Date of the first occurrence
+    """
+    if frequency == 'daily':
+        return start
+    
+    if frequency == 'weekly':
+        return start + timedelta(days=(day - start.weekday()) % 7)
+    
+    year, month = start.year, start.month
+    while True:
+        candidate = date(year, month, min(day, calendar.monthrange(year, month)[1]))
+        if candidate >= start:
+            return candidate
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def next_occurrence(rule: RecurringRule, after: date) -> date:
+    """Get the first occurrence of a rule strictly after a date."""
+    return first_occurrence(rule.frequency, rule.day, after + timedelta(days=1))
+
+
+class RecurringStore:
+    """Local store of recurring expense rules."""
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS recurring_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            frequency TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            amount REAL NOT NULL,
+            comment TEXT NOT NULL DEFAULT '',
+            next_run TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_recurring_rules_user ON recurring_rules (user_id);
+    """
+    
+    def __init__(self, path: str):
+        """
+        Open the rule store.
+        
+        Args:
+            path: Local database file path
+        """
+        self._db = LocalDatabase(path, self.SCHEMA)
+    
+    @staticmethod
+    def _to_rule(row) -> RecurringRule:
+        """Convert a database row to a rule."""
+        return RecurringRule(
+            id=row['id'],
+            user_id=row['user_id'],
+            chat_id=row['chat_id'],
+            frequency=row['frequency'],
+            day=row['day'],
+            category=row['category'],
+            amount=row['amount'],
+            comment=row['comment'],
+            next_run=date.fromisoformat(row['next_run'])
+        )
+    
+    def add_rule(self, user_id: int, chat_id: int, rule: RecurringRuleInput) -> RecurringRule:
+        """
+        Store a new rule, first due on its next occurrence from today.
+        
+        Args:
+            user_id: Telegram user ID
+            chat_id: Chat receiving notifications for the rule
+            rule: Validated rule input
+        
+        Returns:
+            Stored rule
+        """
+        next_run = first_occurrence(rule.frequency, rule.day, date.today())
+        with self._db.transaction() as db:
+            cursor = db.execute(
+                "INSERT INTO recurring_rules "
+                "(user_id, chat_id, frequency, day, category, amount, comment, next_run) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, chat_id, rule.frequency, rule.day, rule.category,
+                 rule.amount, rule.comment, next_run.isoformat())
+            )
+            rule_id = cursor.lastrowid
+        
+        return RecurringRule(
+            rule_id, user_id, chat_id, rule.frequency, rule.day,
+            rule.category, rule.amount, rule.comment, next_run
+        )
+    
+    def remove_rule(self, user_id: int, rule_id: int) -> bool:
+        """
+        Delete a user's rule.
+        
+        Args:
+            user_id: Telegram user ID owning the rule
+            rule_id: Rule ID
+        
+        Returns:
+            bool: True if a rule was removed
+        """
+        with self._db.transaction() as db:
+            cursor = db.execute(
+                "DELETE FROM recurring_rules WHERE id = ? AND user_id = ?",
+                (rule_id, user_id)
+            )
+            return cursor.rowcount > 0
+    
+    def get_user_rules(self, user_id: int) -> List[RecurringRule]:
+        """Get a user's rules ordered by ID."""
+        rows = self._db.query("SELECT * FROM recurring_rules WHERE user_id = ? ORDER BY id", (user_id,))
+        return [self._to_rule(row) for row in rows]
+    
+    def get_all_rules(self) -> List[RecurringRule]:
+        """Get rules of all users."""
+        return [self._to_rule(row) for row in self._db.query("SELECT * FROM recurring_rules")]
+    
+    def update_next_runs(self, updates: List[Tuple[int, date]]) -> None:
+        """
+        Advance the next run date of several rules in one transaction.
+        
+        Args:
+            updates: Pairs of rule ID and new next run date
+        """
+        with self._db.transaction() as db:
+            db.executemany(
+                "UPDATE recurring_rules SET next_run = ? WHERE id = ?",
+                [(next_run.isoformat(), rule_id) for rule_id, next_run in updates]
+            )
+    
+    def close(self) -> None:
+        """Close the database connection."""
+        self._db.close()
+
+
+class RecurringScheduler:
+    """
+    Single-task scheduler materializing recurring expenses.
+    
+    Rules are kept in a min-heap ordered by next run, so the task sleeps
+    until the earliest due rule no matter how many rules exist. All rules
+    due at the same time are materialized together with one add_expenses
+    call (one append per monthly worksheet on Google Sheets). Occurrences
+    missed while the bot was down are caught up on startup. Occurrence
+    idempotency keys make a repeated materialization after a crash safe.
+    """
+    
+    # Upper bound on a single sleep, so clock changes are picked up
+    MAX_SLEEP = 3600.0
+    
+    # Delay before retrying a failed materialization
+    RETRY_DELAY = 60.0
+    
+    # Maximum occurrences of one rule caught up in a single run
+    MAX_CATCH_UP = 400
+    
+    def __init__(self, store: RecurringStore, storage: ExpenseStorage):
+        """
+        Initialize the scheduler.
+        
+        Args:
+            store: Recurring rule store
+            storage: Expense storage receiving materialized expenses
+        """
+        self.store = store
+        self.storage = storage
+        self._rules: Dict[int, RecurringRule] = {}
+        # rule_id -> time of its live heap entry; other entries are stale
+        self._due_at: Dict[int, datetime] = {}
+        self._heap: List[Tuple[datetime, int]] = []
+        self._wakeup = asyncio.Event()
+    
+    @staticmethod
+    def _run_at(rule: RecurringRule) -> datetime:
+        """Time a rule becomes due (start of its next run day)."""
+        return datetime.combine(rule.next_run, time.min)
+    
+    def schedule(self, rule: RecurringRule) -> None:
+        """
+        Add or replace a rule in the schedule.
+        
+        Args:
+            rule: Rule to schedule
+        """
+        self._rules[rule.id] = rule
+        self._push(rule.id, self._run_at(rule))
+    
+    def _push(self, rule_id: int, run_at: datetime) -> None:
+        """Queue a rule to run at a given time, replacing its previous entry."""
+        self._due_at[rule_id] = run_at
+        heapq.heappush(self._heap, (run_at, rule_id))
+        self._wakeup.set()
+    
+    def unschedule(self, rule_id: int) -> None:
+        """
+        Remove a rule from the schedule; its heap entry is skipped lazily.
+        
+        Args:
+            rule_id: Rule ID
+        """
+        self._rules.pop(rule_id, None)
+        self._due_at.pop(rule_id, None)
+    
+    async def run(self, on_materialized: Callable[[List[Tuple[RecurringRule, ExpenseInput]]], Awaitable[None]]) -> None:
+        """
+        Run the scheduler loop forever.
+        
+        Args:
+            on_materialized: Called with (rule, expense) pairs after each saved batch
+        """
+        for rule in await asyncio.to_thread(self.store.get_all_rules):
+            self.schedule(rule)
+        
+        while True:
+            now = datetime.now()
+            if self._heap and self._heap[0][0] <= now:
+                await self._materialize_due(now, on_materialized)
+                continue
+            
+            delay = self.MAX_SLEEP
+            if self._heap:
+                delay = min(delay, (self._heap[0][0] - now).total_seconds())
+            
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+    
+    def _pop_due(self, now: datetime) -> List[RecurringRule]:
+        """Pop all rules due at or before now, skipping stale heap entries."""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            run_at, rule_id = heapq.heappop(self._heap)
+            if self._due_at.get(rule_id) == run_at:
+                del self._due_at[rule_id]
+                due.append(self._rules[rule_id])
+        return due
+    
+    async def _materialize_due(
+        self,
+        now: datetime,
+        on_materialized: Callable[[List[Tuple[RecurringRule, ExpenseInput]]], Awaitable[None]]
+    ) -> None:
+        """Save all due occurrences in one batch and reschedule their rules."""
+        due = self._pop_due(now)
+        if not due:
+            return
+        
+        items: List[Tuple[RecurringRule, ExpenseInput]] = []
+        updates: List[Tuple[int, date]] = []
+        
+        for rule in due:
+            occurrence = rule.next_run
+            for _ in range(self.MAX_CATCH_UP):
+                if occurrence > now.date():
+                    break
+                items.append((rule, ExpenseInput(
+                    category=rule.category,
+                    amount=rule.amount,
+                    comment=rule.comment,
+                    user_id=rule.user_id,
+                    date=datetime.combine(occurrence, time.min),
+                    idempotency_key=f"recurring:{rule.id}:{occurrence.isoformat()}"
+                )))
+                occurrence = next_occurrence(rule, occurrence)
+            updates.append((rule.id, occurrence))
+        
+        try:
+            await asyncio.to_thread(self.storage.add_expenses, [expense for _, expense in items])
+            await asyncio.to_thread(self.store.update_next_runs, updates)
+        except Exception as e:
+            logger.warning(f"Failed to materialize {len(items)} recurring expenses: {e}")
+            retry_at = now + timedelta(seconds=self.RETRY_DELAY)
+            for rule in due:
+                if rule.id in self._rules:
+                    self._push(rule.id, retry_at)
+            return
+        
+        for rule, (_, next_run) in zip(due, updates):
+            # Skip rules removed while the batch was being saved
+            if rule.id in self._rules:
+                self.schedule(rule._replace(next_run=next_run))
+        
+        logger.info(f"Materialized {len(items)} recurring expenses for {len(due)} rules")
+        try:
+            await on_materialized(items)
+        except Exception as e:
+            logger.warning(f"Failed to announce recurring expenses: {e}")
+
+
+def create_recurring_store() -> RecurringStore:
+    """
+    Create the recurring rule store from the application configuration.
+    
+    Returns:
+        RecurringStore using LOCAL_DB_PATH
+    """
+    return RecurringStore(Config.LOCAL_DB_PATH)
@@ -0,0 +1,333 @@
+"""
+Replay and load-generation tool for the Expense Tracker Bot.
+
+Plays a recording made with RECORD_UPDATES_PATH back against the real
+dispatcher and handlers, with a stub Telegram session and a fake Sheets
+backend, and reports handler latency, concurrency and API calls.
+
+Usage:
+    python replay.py updates.jsonl                 # original timing
+    python replay.py updates.jsonl --speed 10      # 10x faster
+    python replay.py updates.jsonl --speed 0       # all at once
+    python replay.py updates.jsonl --repeat 5 --sheets-latency 300
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat, Message
+
+from config import Config
+from recorder import read_recording
+from sqlite_storage import SQLiteStorage
+
+
+class StubSession(BaseSession):
+    """
+    Telegram session that answers every API call locally.
+    
+    Sent messages are echoed back as Message objects, other methods return
+    True. Calls are counted per method and can be given a fixed latency.
+    """
+    
+    def __init__(self, latency: float = 0.0):
+        """
+        Initialize the session.
+        
+        Args:
+            latency: Seconds each API call takes
+        """
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_id = 0
+    
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        """Count the call and return a plausible result."""
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        
+        if method.__returning__ is Message:
+            self._message_id += 1
+            return Message(
+                message_id=self._message_id,
+                date=datetime.now(),
+                chat=Chat(id=getattr(method, "chat_id", 0), type="private"),
+                text=getattr(method, "text", None)
+            )
+        return True
+    
+    def stream_content(self, *args, **kwargs):
+        """Downloads are not supported in replays; fails as soon as one is requested."""
+        raise RuntimeError("File downloads are not supported in replays")
+    
+    async def close(self) -> None:
+        """Nothing to close."""
+
+
+class FakeSheetsStorage(SQLiteStorage):
+    """
+    In-memory stand-in for Google Sheets.
+    
+    Keeps data in a throwaway SQLite database and adds a fixed latency to
+    every call, modelling the Sheets round trip. Calls are counted per
+    method, along with the most calls that ran at the same time.
+    """
+    
+    def __init__(self, latency: float = 0.0):
+        """
+        Initialize the fake backend.
+        
+        Args:
+            latency: Seconds each storage call takes
+        """
+        super().__init__(":memory:")
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.max_concurrent = 0
+        self._concurrent = 0
+        self._lock = threading.Lock()
+    
+    def _call(self, name: str, fn, *args):
+        """Run a storage call with the simulated latency and bookkeeping."""
+        with self._lock:
+            self.calls[name] += 1
+            self._concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self._concurrent)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._concurrent -= 1
+    
+    def add_expense(self, expense, retry: bool = True) -> bool:
+        """Save one expense."""
+        self._call("add_expense", super().add_expenses, [expense])
+        return True
+    
+    def add_expenses(self, expenses) -> int:
+        """Save a batch of expenses."""
+        return self._call("add_expenses", super().add_expenses, expenses)
+    
+    def get_records_by_date_range(self, start_date, end_date=None, user_id=None) -> List[Dict]:
+        """Get records within a date range."""
+        return self._call(
+            "get_records_by_date_range", super().get_records_by_date_range, start_date, end_date, user_id
+        )
+    
+    def get_statistics_summary(self, user_id: int) -> Dict[str, Dict]:
+        """Get statistics for today, week and month."""
+        return self._call("get_statistics_summary", super().get_statistics_summary, user_id)
+    
+    def get_statistics(self, period: str, user_id: int) -> Dict:
+        """Get statistics for one period."""
+        # The base method goes through get_statistics_summary, which would count twice
+        summary = self._call("get_statistics", super().get_statistics_summary, user_id)
+        return summary.get(period, {"error": "Invalid period"})
+    
+    def get_recent_expenses(self, user_id: int, limit: int) -> List:
+        """Get a user's most recent expenses."""
+        return self._call("get_recent_expenses", super().get_recent_expenses, user_id, limit)
+    
+    def delete_expense(self, user_id: int, key: str) -> bool:
+        """Delete an expense."""
+        return self._call("delete_expense", super().delete_expense, user_id, key)
+    
+    def update_expense(self, expense) -> bool:
+        """Overwrite an expense."""
+        return self._call("update_expense", super().update_expense, expense)
+    
+    def get_categories(self, user_id: Optional[int] = None) -> List[str]:
+        """Get used and default categories."""
+        return self._call("get_categories", super().get_categories, user_id)
+
+
+def sender_id(update: Dict[str, Any]) -> Optional[int]:
+    """Get the sender of a serialized update (message, callback query, ...)."""
+    for value in update.values():
+        if isinstance(value, dict) and "from" in value:
+            return value["from"].get("id")
+    return None
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Get a percentile of sorted values (nearest rank)."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+def schedule_offsets(entries: List[Dict[str, Any]]) -> List[float]:
+    """
+    Get the replay time of each recorded entry, relative to the first one.
+    
+    Keeps the original spacing within a bot run; runs recorded into the same
+    file are played back to back, one second apart, without the downtime
+    between them. Recordings without session IDs count as a single run.
+    
+    Args:
+        entries: Recorded entries in file order
+    
+    Returns:
+        Non-decreasing offsets in seconds, one per entry
+    """
+    offsets: List[float] = []
+    session: Any = object()
+    base = session_start = last = 0.0
+    for entry in entries:
+        if entry.get("session") != session:
+            session = entry.get("session")
+            base = last + 1.0 if offsets else 0.0
+            session_start = entry["t"]
+        # Wall-clock adjustments must not move an entry before the previous one
+        last = max(last, base + entry["t"] - session_start)
+        offsets.append(last)
+    return offsets
+
+
+def build_dispatcher(allowed_users: frozenset, rate_limit: bool) -> Dispatcher:
+    """
+    Build a dispatcher wired like bot.py, using the fake backend.
+    
+    Args:
+        allowed_users: Whitelisted (pseudonymous) user IDs
+        rate_limit: Apply the configured per-user rate limit
+    
+    Returns:
+        Dispatcher with the handlers router and middlewares
+    """
+    from access import AccessMiddleware, RateLimiter, Whitelist
+    from handlers import router
+    from structured_logging import CorrelationMiddleware
+    
+    dp = Dispatcher()
+    dp.include_router(router)
+    dp.update.outer_middleware(CorrelationMiddleware())
+    dp.update.outer_middleware(AccessMiddleware(
+        whitelist=Whitelist(allowed_users, None, Config.WHITELIST_RELOAD_INTERVAL),
+        rate_limiter=RateLimiter(Config.RATE_LIMIT_PER_MINUTE if rate_limit else 0, Config.RATE_LIMIT_BURST)
+    ))
+    return dp
+
+
+async def replay(args: argparse.Namespace) -> None:
+    """
+    Replay a recording and print a report.
+    
+    Args:
+        args: Parsed command-line arguments
+    """
+    entries = list(read_recording(args.recording))
+    if not entries:
+        print("Recording is empty")
+        return
+    
+    # Handlers open their stores on import; keep them in a throwaway directory
+    Config.STORAGE_BACKEND = "sqlite"
+    Config.LOCAL_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="replay-"), "replay.db")
+    
+    import handlers
+    
+    fake_storage = FakeSheetsStorage(args.sheets_latency / 1000)
+    handlers.storage = fake_storage
+    handlers.recurring_scheduler.storage = fake_storage
+    
+    allowed = frozenset(sender_id(entry["update"]) for entry in entries if entry.get("allowed"))
+    dp = build_dispatcher(allowed, rate_limit=not args.no_rate_limit)
+    session = StubSession(args.api_latency / 1000)
+    bot = Bot(token="42:REPLAY", session=session)
+    
+    latencies: List[float] = []
+    lags: List[float] = []
+    depths: List[int] = []
+    in_flight = 0
+    errors = 0
+    
+    async def feed(update: Dict[str, Any], due: float) -> None:
+        nonlocal in_flight, errors
+        started = time.perf_counter()
+        lags.append(started - due)
+        in_flight += 1
+        depths.append(in_flight)
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception as e:
+            errors += 1
+            if errors == 1:
+                print(f"First handler error: {e!r}")
+        finally:
+            in_flight -= 1
+            latencies.append(time.perf_counter() - started)
+    
+    offsets = schedule_offsets(entries)
+    duration = offsets[-1]
+    tasks = []
+    start = time.perf_counter()
+    for cycle in range(args.repeat):
+        cycle_offset = cycle * (duration + 1)
+        for index, entry in enumerate(entries):
+            offset = (offsets[index] + cycle_offset) / args.speed if args.speed > 0 else 0.0
+            due = start + offset
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            
+            update = dict(entry["update"])
+            # Unique update IDs per cycle keep FSM and idempotency keys distinct
+            update["update_id"] = cycle * len(entries) + index
+            message = update.get("message")
+            if message is not None and args.repeat > 1:
+                update["message"] = {**message, "message_id": message["message_id"] + cycle * 10_000_000}
+            tasks.append(asyncio.create_task(feed(update, due)))
+    
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    await bot.session.close()
+    
+    latencies_ms = sorted(value * 1000 for value in latencies)
+    lags_ms = sorted(value * 1000 for value in lags)
+    print(f"Updates replayed: {len(latencies)} in {elapsed:.2f} s ({len(latencies) / elapsed:.1f}/s), errors: {errors}")
+    print(
+        "Handler latency ms: "
+        f"p50={percentile(latencies_ms, 50):.1f} p90={percentile(latencies_ms, 90):.1f} "
+        f"p99={percentile(latencies_ms, 99):.1f} max={latencies_ms[-1]:.1f} "
+        f"mean={statistics.fmean(latencies_ms):.1f}"
+    )
+    print(f"Scheduling lag ms: p50={percentile(lags_ms, 50):.1f} max={lags_ms[-1]:.1f}")
+    print(f"Updates in flight: max={max(depths)} mean={statistics.fmean(depths):.1f}")
+    print(f"Storage calls in flight: max={fake_storage.max_concurrent}")
+    print("Telegram API calls: " + ", ".join(f"{name}={count}" for name, count in session.calls.most_common()))
+    print("Storage calls: " + ", ".join(f"{name}={count}" for name, count in fake_storage.calls.most_common()))
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Replay recorded updates against the bot's handlers.")
+    parser.add_argument("recording", help="JSONL file written via RECORD_UPDATES_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed factor; 0 sends everything at once")
+    parser.add_argument("--repeat", type=int, default=1, help="Play the recording this many times in a row")
+    parser.add_argument("--sheets-latency", type=float, default=250.0, help="Simulated Sheets call latency in ms")
+    parser.add_argument("--api-latency", type=float, default=50.0, help="Simulated Telegram API latency in ms")
+    parser.add_argument("--no-rate-limit", action="store_true", help="Disable the per-user rate limit")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(replay(parse_args()))
@@ -0,0 +1,261 @@
+"""
+Row location index module.
+Remembers where each user's recent expenses were written in Google Sheets,
+so they can be edited or deleted with one targeted call instead of a scan.
+"""
+
+import threading
+from datetime import datetime
+from typing import Iterable, List, NamedTuple, Optional
+
+from gspread.utils import a1_range_to_grid_range
+
+from config import Config
+from sqlite_storage import DATE_FORMAT, LocalDatabase
+from validators import ExpenseInput
+
+
+class RowLocation(NamedTuple):
+    """Indexed expense row and the worksheet row it was written to."""
+    
+    key: str
+    user_id: int
+    spreadsheet_key: Optional[str]
+    worksheet: str
+    row: int
+    date: datetime
+    category: str
+    amount: float
+    comment: str
+    
+    def to_expense(self) -> ExpenseInput:
+        """Rebuild the expense stored in the row."""
+        return ExpenseInput(
+            category=self.category,
+            amount=self.amount,
+            comment=self.comment,
+            user_id=self.user_id,
+            date=self.date,
+            idempotency_key=self.key
+        )
+
+
+def parse_updated_rows(response: dict) -> range:
+    """
+    Get the worksheet rows written by a values.append call.
+    
+    Args:
+        response: Append response, with the A1 range written under
+            updates.updatedRange (e.g. "'May 2025'!A12:F14")
+    
+    Returns:
+        1-based row numbers in the order the values were sent
+    """
+    updated_range = response['updates']['updatedRange']
+    grid = a1_range_to_grid_range(updated_range.rsplit("!", 1)[-1])
+    return range(grid['startRowIndex'] + 1, grid['endRowIndex'] + 1)
+
+
+class RowIndex:
+    """
+    Local index of (user, idempotency key) -> (worksheet, row number).
+    
+    Row numbers are captured from append responses, so locating an expense
+    costs no Sheets call. Deleting a row shifts every indexed row below it
+    in the same worksheet up by one, in the same transaction, so the index
+    keeps matching the sheet. Rows edited by hand can still move entries
+    out of place; callers check the key cell before acting on a location.
+    Only the latest `history_size` expenses per user are kept, along with
+    their values, so recent expenses can be listed without reading the sheet.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS expense_rows (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            spreadsheet_key TEXT NOT NULL DEFAULT '',
+            worksheet TEXT NOT NULL,
+            row INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            category TEXT NOT NULL,
+            amount REAL NOT NULL,
+            comment TEXT NOT NULL DEFAULT '',
+            UNIQUE (user_id, key)
+        );
+        CREATE INDEX IF NOT EXISTS idx_expense_rows_position ON expense_rows (spreadsheet_key, worksheet, row);
+    """
+    
+    def __init__(self, path: str, history_size: int = 10):
+        """
+        Open the index.
+        
+        Args:
+            path: Local database file path
+            history_size: Recent expenses remembered per user
+        """
+        self._db = LocalDatabase(path, self.SCHEMA)
+        self.history_size = history_size
+        # Held while a row is checked and changed, so a concurrent delete
+        # cannot shift it in between
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def _to_location(row) -> RowLocation:
+        """Convert a database row to a RowLocation."""
+        return RowLocation(
+            key=row['key'],
+            user_id=row['user_id'],
+            spreadsheet_key=row['spreadsheet_key'] or None,
+            worksheet=row['worksheet'],
+            row=row['row'],
+            date=datetime.strptime(row['date'], DATE_FORMAT),
+            category=row['category'],
+            amount=row['amount'],
+            comment=row['comment']
+        )
+    
+    def record(
+        self,
+        spreadsheet_key: Optional[str],
+        worksheet: str,
+        expenses: Iterable[ExpenseInput],
+        rows: Iterable[int]
+    ) -> None:
+        """
+        Index appended expenses.
+        
+        Expenses without an idempotency key cannot be addressed later and
+        are skipped.
+        
+        Args:
+            spreadsheet_key: Spreadsheet key, or None for the shared spreadsheet
+            worksheet: Worksheet name
+            expenses: Appended expenses
+            rows: Row number of each expense, in the same order
+        """
+        entries = [
+            (
+                expense.idempotency_key, expense.user_id, spreadsheet_key or "", worksheet, row,
+                expense.date.strftime(DATE_FORMAT), expense.category, expense.amount, expense.comment or ""
+            )
+            for expense, row in zip(expenses, rows)
+            if expense.idempotency_key
+        ]
+        if not entries:
+            return
+        
+        with self._db.transaction() as db:
+            db.executemany(
+                "INSERT INTO expense_rows "
+                "(key, user_id, spreadsheet_key, worksheet, row, date, category, amount, comment) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_id, key) DO UPDATE SET "
+                "spreadsheet_key = excluded.spreadsheet_key, worksheet = excluded.worksheet, row = excluded.row",
+                entries
+            )
+            for user_id in {entry[1] for entry in entries}:
+                db.execute(
+                    "DELETE FROM expense_rows WHERE user_id = ? AND id NOT IN "
+                    "(SELECT id FROM expense_rows WHERE user_id = ? ORDER BY id DESC LIMIT ?)",
+                    (user_id, user_id, self.history_size)
+                )
+    
+    def recent(self, user_id: int, limit: int) -> List[RowLocation]:
+        """
+        Get a user's most recently written expenses.
+        
+        Args:
+            user_id: Telegram user ID
+            limit: Maximum number of entries
+        
+        Returns:
+            Locations, newest first
+        """
+        rows = self._db.query(
+            "SELECT * FROM expense_rows WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, limit)
+        )
+        return [self._to_location(row) for row in rows]
+    
+    def get(self, user_id: int, key: str) -> Optional[RowLocation]:
+        """
+        Get the location of an expense.
+        
+        Args:
+            user_id: Telegram user ID
+            key: Idempotency key of the expense
+        
+        Returns:
+            Location, or None if the expense is not indexed
+        """
+        rows = self._db.query("SELECT * FROM expense_rows WHERE user_id = ? AND key = ?", (user_id, key))
+        return self._to_location(rows[0]) if rows else None
+    
+    def move(self, location: RowLocation, row: int) -> None:
+        """
+        Correct the row of an indexed expense found elsewhere in its worksheet.
+        
+        Args:
+            location: Stale location
+            row: Row number the expense was found in
+        """
+        with self._db.transaction() as db:
+            db.execute(
+                "UPDATE expense_rows SET row = ? WHERE user_id = ? AND key = ?",
+                (row, location.user_id, location.key)
+            )
+    
+    def update(self, expense: ExpenseInput) -> None:
+        """
+        Store new values of an edited expense; its row does not change.
+        
+        Args:
+            expense: Edited expense, identified by user ID and idempotency key
+        """
+        with self._db.transaction() as db:
+            db.execute(
+                "UPDATE expense_rows SET date = ?, category = ?, amount = ?, comment = ? "
+                "WHERE user_id = ? AND key = ?",
+                (
+                    expense.date.strftime(DATE_FORMAT), expense.category, expense.amount,
+                    expense.comment or "", expense.user_id, expense.idempotency_key
+                )
+            )
+    
+    def remove(self, location: RowLocation, shift: bool = True) -> None:
+        """
+        Forget a deleted row and shift the rows below it up by one.
+        
+        Args:
+            location: Location of the deleted row
+            shift: Whether the row was deleted from the worksheet; False
+                only drops an entry whose row is already gone
+        """
+        position = (location.spreadsheet_key or "", location.worksheet)
+        with self._db.transaction() as db:
+            db.execute(
+                "DELETE FROM expense_rows WHERE user_id = ? AND key = ?",
+                (location.user_id, location.key)
+            )
+            if not shift:
+                return
+            db.execute(
+                "UPDATE expense_rows SET row = row - 1 "
+                "WHERE spreadsheet_key = ? AND worksheet = ? AND row > ?",
+                (*position, location.row)
+            )
+    
+    def close(self) -> None:
+        """Close the database connection."""
+        self._db.close()
+
+
+def create_row_index() -> RowIndex:
+    """
+    Create the row index from the application configuration.
+    
+    Returns:
+        RowIndex using LOCAL_DB_PATH and EDIT_HISTORY_SIZE
+    """
+    return RowIndex(Config.LOCAL_DB_PATH, Config.EDIT_HISTORY_SIZE)
@@ -0,0 +1,274 @@
+"""
+Connection pool module for Google Sheets.
+Keeps a set of authorized gspread clients, each with its own credentials
+and keep-alive HTTP session, and replaces failed ones individually.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterator, Optional
+
+import gspread
+from google.auth.credentials import Credentials
+from google.auth.transport.requests import AuthorizedSession, Request
+
+from structured_logging import timed
+
+
+logger = logging.getLogger(__name__)
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """
+    Check whether an error means the underlying HTTP connection is broken.
+    
+    Args:
+        error: Exception raised by a Sheets call
+    
+    Returns:
+        bool: True for network-level failures, False for API errors
+    """
+    if isinstance(error, (ConnectionError, OSError)):
+        return True
+    return "Connection" in str(error)
+
+
+class SheetsConnection:
+    """
+    Authorized gspread client with its own credentials and HTTP session.
+    
+    The session keeps its HTTP connection alive between calls, and the
+    shared spreadsheet handle is opened once and reused for the connection's
+    lifetime. Handles of per-user spreadsheets are kept in a bounded LRU, so
+    active tenants skip the metadata request of reopening their spreadsheet.
+    """
+    
+    def __init__(
+        self,
+        credentials_factory: Callable[[], Credentials],
+        spreadsheet_opener: Callable[[gspread.Client], gspread.Spreadsheet],
+        spreadsheet_cache_size: int = 32
+    ):
+        """
+        Create and authorize a new connection.
+        
+        Args:
+            credentials_factory: Returns fresh credentials for this connection
+            spreadsheet_opener: Opens (or creates) the spreadsheet with a client
+            spreadsheet_cache_size: Maximum number of per-user spreadsheet
+                handles kept open
+        """
+        self._spreadsheet_opener = spreadsheet_opener
+        self._spreadsheet: Optional[gspread.Spreadsheet] = None
+        self._spreadsheet_cache_size = max(1, spreadsheet_cache_size)
+        self._spreadsheets: "OrderedDict[str, gspread.Spreadsheet]" = OrderedDict()
+        self._token_request = Request()
+        self.credentials = credentials_factory()
+        self.session = AuthorizedSession(self.credentials)
+        self.client = gspread.Client(auth=self.credentials, session=self.session)
+        self.last_used = time.monotonic()
+    
+    @property
+    def spreadsheet(self) -> gspread.Spreadsheet:
+        """Spreadsheet handle bound to this connection's client."""
+        if self._spreadsheet is None:
+            self._spreadsheet = self._spreadsheet_opener(self.client)
+        return self._spreadsheet
+    
+    def open_spreadsheet(self, key: Optional[str] = None) -> gspread.Spreadsheet:
+        """
+        Get a spreadsheet handle bound to this connection's client.
+        
+        A connection is used by one thread at a time, so the cache needs no lock.
+        
+        Args:
+            key: Spreadsheet key, or None for the shared spreadsheet
+        
+        Returns:
+            Spreadsheet handle, opened on first use
+        """
+        if key is None:
+            return self.spreadsheet
+        
+        spreadsheet = self._spreadsheets.get(key)
+        if spreadsheet is not None:
+            self._spreadsheets.move_to_end(key)
+            return spreadsheet
+        
+        with timed(logger, "sheets.open_spreadsheet"):
+            spreadsheet = self.client.open_by_key(key)
+        self._spreadsheets[key] = spreadsheet
+        if len(self._spreadsheets) > self._spreadsheet_cache_size:
+            self._spreadsheets.popitem(last=False)
+        return spreadsheet
+    
+    def refresh_if_expiring(self, margin: timedelta) -> None:
+        """
+        Refresh the access token before it expires.
+        
+        Args:
+            margin: Refresh when the token expires within this interval
+        """
+        expiry = self.credentials.expiry
+        # google-auth keeps expiry as a naive UTC datetime
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if not self.credentials.token or expiry is None or expiry - now <= margin:
+            self.credentials.refresh(self._token_request)
+    
+    def check_health(self) -> bool:
+        """
+        Probe the connection with a minimal metadata request.
+        
+        Returns:
+            bool: True if the spreadsheet answered, False otherwise
+        """
+        try:
+            self.spreadsheet.fetch_sheet_metadata({'fields': 'spreadsheetId'})
+            return True
+        except Exception:
+            return False
+    
+    def close(self) -> None:
+        """Close the HTTP session."""
+        self.session.close()
+
+
+class SheetsClientPool:
+    """
+    Bounded pool of Sheets connections.
+    
+    Connections are created lazily up to the pool size. A connection that
+    fails with a network error is closed and replaced on its own, so the
+    other connections and their open spreadsheets are unaffected.
+    """
+    
+    def __init__(
+        self,
+        size: int,
+        credentials_factory: Callable[[], Credentials],
+        spreadsheet_opener: Callable[[gspread.Client], gspread.Spreadsheet],
+        refresh_margin: int = 300,
+        health_check_interval: int = 300,
+        spreadsheet_cache_size: int = 32
+    ):
+        """
+        Initialize the pool.
+        
+        Args:
+            size: Maximum number of open connections
+            credentials_factory: Returns fresh credentials for a new connection
+            spreadsheet_opener: Opens (or creates) the spreadsheet with a client
+            refresh_margin: Seconds before token expiry to refresh it
+            health_check_interval: Seconds a connection may sit idle before
+                it is probed on checkout
+            spreadsheet_cache_size: Per-user spreadsheet handles kept open
+                by each connection
+        """
+        self.size = max(1, size)
+        self._credentials_factory = credentials_factory
+        self._spreadsheet_opener = spreadsheet_opener
+        self._refresh_margin = timedelta(seconds=refresh_margin)
+        self._health_check_interval = health_check_interval
+        self._spreadsheet_cache_size = spreadsheet_cache_size
+        # LIFO keeps recently used connections (and their sockets) warm
+        self._idle: "queue.LifoQueue[SheetsConnection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open_count = 0
+    
+    def _acquire(self) -> SheetsConnection:
+        """Take an idle connection, open a new one, or wait for one to free up."""
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            
+            with self._lock:
+                can_open = self._open_count < self.size
+                if can_open:
+                    self._open_count += 1
+            
+            if can_open:
+                try:
+                    return SheetsConnection(
+                        self._credentials_factory,
+                        self._spreadsheet_opener,
+                        self._spreadsheet_cache_size
+                    )
+                except Exception:
+                    with self._lock:
+                        self._open_count -= 1
+                    raise
+            
+            # Wake up periodically in case a slot was freed by a discarded connection
+            try:
+                return self._idle.get(timeout=1.0)
+            except queue.Empty:
+                continue
+    
+    def _checkout(self) -> SheetsConnection:
+        """
+        Acquire a connection that is ready for use.
+        
+        Refreshes the token ahead of expiry and probes connections that have
+        been idle for long; one failing the probe is replaced with a new one.
+        """
+        while True:
+            connection = self._acquire()
+            try:
+                connection.refresh_if_expiring(self._refresh_margin)
+            except Exception:
+                self._discard(connection)
+                raise
+            
+            idle_for = time.monotonic() - connection.last_used
+            if idle_for <= self._health_check_interval or connection.check_health():
+                return connection
+            
+            logger.warning("Sheets connection failed health check, replacing it")
+            self._discard(connection)
+    
+    def _discard(self, connection: SheetsConnection) -> None:
+        """Close a broken connection and free its slot."""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._open_count -= 1
+    
+    @contextmanager
+    def connection(self) -> Iterator[SheetsConnection]:
+        """
+        Borrow a connection for the duration of a with-block.
+        
+        Yields:
+            SheetsConnection ready for API calls
+        """
+        connection = self._checkout()
+        try:
+            yield connection
+        except BaseException as e:
+            if is_connection_error(e):
+                logger.warning(f"Dropping broken Sheets connection: {e}")
+                self._discard(connection)
+                connection = None
+            raise
+        finally:
+            if connection is not None:
+                connection.last_used = time.monotonic()
+                self._idle.put(connection)
+    
+    def close(self) -> None:
+        """Close all idle connections."""
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(connection)
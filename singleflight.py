@@ -0,0 +1,66 @@
+"""
+Request coalescing module.
+Lets concurrent identical calls share one in-flight execution and its result.
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into a single execution.
+    
+    The first caller for a key runs the function; callers arriving while it
+    is still running wait for and receive the same result (or exception).
+    Called from worker threads; event loop code reaches it through
+    asyncio.to_thread, so a cancelled task never cancels the shared call.
+    
+    Results are shared between callers and must be treated as read-only.
+    """
+    
+    def __init__(self):
+        """Initialize an empty in-flight table."""
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+    
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn, or wait for an identical call that is already running.
+        
+        Args:
+            key: Identifies calls that return the same result
+            fn: Function to run if no call for key is in flight
+        
+        Returns:
+            Result of fn from this or the in-flight call
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                # Running futures cannot be cancelled, so no waiter can
+                # cancel the result the others are waiting for
+                future.set_running_or_notify_cancel()
+                self._calls[key] = future
+        
+        if not leader:
+            return future.result()
+        
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+        
+        self._finish(key)
+        future.set_result(result)
+        return result
+    
+    def _finish(self, key: Hashable) -> None:
+        """Remove a completed call so the next caller starts a fresh one."""
+        with self._lock:
+            self._calls.pop(key, None)
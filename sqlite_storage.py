@@ -0,0 +1,589 @@
+"""
+Local SQLite storage backend.
+Stores expenses in an embedded database and optionally mirrors them to
+Google Sheets in the background.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Collection, Dict, Iterator, List, Optional
+
+from config import Config
+from validators import ExpenseInput
+
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+
+class LocalDatabase:
+    """
+    Thread-safe wrapper around a local SQLite connection.
+    
+    Uses WAL mode with relaxed fsync, so a write is a sub-millisecond local
+    transaction. A single connection is shared by all threads and access is
+    serialized with a lock, which also works for ':memory:' databases.
+    """
+    
+    def __init__(self, path: str, schema: str = ""):
+        """
+        Open (or create) the database.
+        
+        Args:
+            path: Database file path, or ':memory:' for a throwaway database
+            schema: SQL script creating tables and indexes if missing
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA temp_store=MEMORY")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        if schema:
+            self._db.executescript(schema)
+    
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in one transaction, serialized across threads."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+    
+    def query(self, sql: str, params=()) -> List[sqlite3.Row]:
+        """Run a read-only query and fetch all rows."""
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+    
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._db.close()
+
+
+class SQLiteStorage:
+    """
+    Expense storage in a local SQLite database.
+    
+    Batches are inserted in a single transaction. Every row gets a unique
+    idempotency key, generated if the expense has none.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            category TEXT NOT NULL,
+            amount REAL NOT NULL,
+            comment TEXT NOT NULL DEFAULT '',
+            user_id INTEGER NOT NULL,
+            key TEXT NOT NULL UNIQUE,
+            synced INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_expenses_user_date ON expenses (user_id, date);
+        CREATE INDEX IF NOT EXISTS idx_expenses_unsynced ON expenses (id) WHERE synced = 0;
+    """
+    
+    INSERT_SQL = (
+        "INSERT OR IGNORE INTO expenses (date, category, amount, comment, user_id, key) "
+        "VALUES (?, ?, ?, ?, ?, ?)"
+    )
+    
+    def __init__(self, path: str):
+        """
+        Open (or create) the database.
+        
+        Args:
+            path: Database file path, or ':memory:' for a throwaway database
+        """
+        self.path = path
+        self._data_versions: Dict[int, int] = {}
+        self._db = LocalDatabase(path, self.SCHEMA)
+    
+    @staticmethod
+    def _to_row(expense: ExpenseInput) -> tuple:
+        """Convert an expense to an insert parameter tuple."""
+        return (
+            expense.date.strftime(DATE_FORMAT),
+            expense.category,
+            expense.amount,
+            expense.comment or "",
+            expense.user_id,
+            expense.idempotency_key or f"local:{uuid.uuid4().hex}"
+        )
+    
+    @staticmethod
+    def _to_expense(row: sqlite3.Row) -> ExpenseInput:
+        """Convert a database row to an expense."""
+        return ExpenseInput(
+            category=row['category'],
+            amount=row['amount'],
+            comment=row['comment'],
+            user_id=row['user_id'],
+            date=datetime.strptime(row['date'], DATE_FORMAT),
+            idempotency_key=row['key']
+        )
+    
+    @staticmethod
+    def _to_record(row: sqlite3.Row) -> Dict:
+        """Convert a database row to a record keyed by spreadsheet headers."""
+        return {
+            'Date': row['date'],
+            'Category': row['category'],
+            'Amount': row['amount'],
+            'Comment': row['comment'],
+            'User ID': row['user_id'],
+            'Key': row['key']
+        }
+    
+    def get_data_version(self, user_id: int) -> int:
+        """
+        Get the write counter for a user's expenses.
+        
+        Args:
+            user_id: Telegram user ID
+        
+        Returns:
+            int: Current data version for the user
+        """
+        return self._data_versions.get(user_id, 0)
+    
+    def _bump_data_version(self, user_id: int) -> None:
+        """Invalidate cached results for a user after a write."""
+        self._data_versions[user_id] = self._data_versions.get(user_id, 0) + 1
+    
+    def add_expense(self, expense: ExpenseInput, retry: bool = True) -> bool:
+        """
+        Add a new expense record.
+        
+        Args:
+            expense: ExpenseInput object containing expense data
+            retry: Unused, kept for interface compatibility
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            self.add_expenses([expense])
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error adding expense: {e}")
+            return False
+    
+    def add_expenses(self, expenses: List[ExpenseInput]) -> int:
+        """
+        Add several expenses in a single transaction.
+        
+        Expenses whose idempotency key is already stored are skipped.
+        
+        Args:
+            expenses: ExpenseInput objects to save
+        
+        Returns:
+            int: Number of expenses saved or already present
+        """
+        with self._db.transaction() as db:
+            db.executemany(self.INSERT_SQL, [self._to_row(expense) for expense in expenses])
+        
+        for user_id in {expense.user_id for expense in expenses}:
+            self._bump_data_version(user_id)
+        return len(expenses)
+    
+    def get_records_by_date_range(
+        self,
+        start_date: datetime,
+        end_date: Optional[datetime] = None,
+        user_id: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Get expense records within a date range.
+        
+        Args:
+            start_date: Start of date range
+            end_date: End of date range (defaults to now)
+            user_id: If given, only return this user's records
+        
+        Returns:
+            List of expense records within the date range
+        """
+        if end_date is None:
+            end_date = datetime.now()
+        
+        sql = "SELECT * FROM expenses WHERE date >= ? AND date <= ?"
+        params: tuple = (start_date.strftime(DATE_FORMAT), end_date.strftime(DATE_FORMAT))
+        if user_id is not None:
+            sql += " AND user_id = ?"
+            params += (user_id,)
+        
+        return [self._to_record(row) for row in self._db.query(sql + " ORDER BY date, id", params)]
+    
+    def get_statistics(self, period: str, user_id: int) -> Dict:
+        """
+        Calculate expense statistics for a given period.
+        
+        Args:
+            period: One of 'today', 'week', 'month'
+            user_id: Telegram user ID to filter by
+        
+        Returns:
+            Dictionary containing total and category breakdown
+        """
+        summary = self.get_statistics_summary(user_id)
+        if period not in summary:
+            return {"error": "Invalid period"}
+        return summary[period]
+    
+    def get_statistics_summary(self, user_id: int) -> Dict[str, Dict]:
+        """
+        Calculate today, week and month statistics with one aggregate query.
+        
+        Args:
+            user_id: Telegram user ID to filter by
+        
+        Returns:
+            Dictionary mapping period name to total, category breakdown and count
+        """
+        now = datetime.now()
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        week_start = today_start - timedelta(days=now.weekday())
+        month_start = today_start.replace(day=1)
+        
+        periods = (('today', today_start), ('week', week_start), ('month', month_start))
+        columns = ", ".join(
+            f"SUM(CASE WHEN date >= :{period} THEN amount END), "
+            f"SUM(CASE WHEN date >= :{period} THEN 1 ELSE 0 END)"
+            for period, _ in periods
+        )
+        params = {period: start.strftime(DATE_FORMAT) for period, start in periods}
+        params.update(
+            user_id=user_id,
+            earliest=min(week_start, month_start).strftime(DATE_FORMAT),
+            now=now.strftime(DATE_FORMAT)
+        )
+        
+        rows = self._db.query(
+            f"SELECT category, {columns} FROM expenses "
+            "WHERE user_id = :user_id AND date >= :earliest AND date <= :now "
+            "GROUP BY category",
+            params
+        )
+        
+        summary = {
+            period: {"period": period, "total": 0.0, "by_category": {}, "count": 0}
+            for period, _ in periods
+        }
+        for row in rows:
+            for index, (period, _) in enumerate(periods):
+                amount, count = row[1 + 2 * index], row[2 + 2 * index]
+                if count:
+                    stats = summary[period]
+                    stats["total"] += amount
+                    stats["by_category"][row['category']] = amount
+                    stats["count"] += count
+        
+        return summary
+    
+    def get_categories(self, user_id: Optional[int] = None) -> List[str]:
+        """
+        Get list of unique categories from all records.
+        
+        Args:
+            user_id: If given, only use this user's records
+        
+        Returns:
+            List of category names
+        """
+        if user_id is None:
+            rows = self._db.query("SELECT DISTINCT category FROM expenses")
+        else:
+            rows = self._db.query("SELECT DISTINCT category FROM expenses WHERE user_id = ?", (user_id,))
+        categories = {row['category'] for row in rows}
+        return sorted(categories.union(Config.DEFAULT_CATEGORIES))
+    
+    def get_recent_expenses(self, user_id: int, limit: int) -> List[ExpenseInput]:
+        """
+        Get a user's most recently saved expenses.
+        
+        Args:
+            user_id: Telegram user ID
+            limit: Maximum number of expenses
+        
+        Returns:
+            List of expenses, newest first
+        """
+        rows = self._db.query(
+            "SELECT * FROM expenses WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, limit)
+        )
+        return [self._to_expense(row) for row in rows]
+    
+    def delete_expense(self, user_id: int, key: str) -> bool:
+        """
+        Delete an expense.
+        
+        Args:
+            user_id: Telegram user ID
+            key: Idempotency key of the expense
+        
+        Returns:
+            bool: True if the expense was deleted
+        """
+        with self._db.transaction() as db:
+            cursor = db.execute("DELETE FROM expenses WHERE user_id = ? AND key = ?", (user_id, key))
+        
+        if cursor.rowcount == 0:
+            return False
+        self._bump_data_version(user_id)
+        return True
+    
+    def update_expense(self, expense: ExpenseInput) -> bool:
+        """
+        Overwrite an expense, keeping its sync state.
+        
+        Args:
+            expense: Expense with the new values, identified by user ID and
+                idempotency key
+        
+        Returns:
+            bool: True if the expense was updated
+        """
+        with self._db.transaction() as db:
+            cursor = db.execute(
+                "UPDATE expenses SET date = ?, category = ?, amount = ?, comment = ? "
+                "WHERE user_id = ? AND key = ?",
+                (
+                    expense.date.strftime(DATE_FORMAT), expense.category, expense.amount,
+                    expense.comment or "", expense.user_id, expense.idempotency_key
+                )
+            )
+        
+        if cursor.rowcount == 0:
+            return False
+        self._bump_data_version(expense.user_id)
+        return True
+    
+    def is_synced(self, user_id: int, key: str) -> bool:
+        """
+        Check whether an expense was already mirrored to Google Sheets.
+        
+        Args:
+            user_id: Telegram user ID
+            key: Idempotency key of the expense
+        
+        Returns:
+            bool: True if the expense is stored and synced
+        """
+        rows = self._db.query("SELECT synced FROM expenses WHERE user_id = ? AND key = ?", (user_id, key))
+        return bool(rows and rows[0]['synced'])
+    
+    def fetch_unsynced(
+        self,
+        limit: int,
+        exclude_user_ids: Collection[int] = (),
+        only_user_ids: Optional[Collection[int]] = None
+    ) -> List[ExpenseInput]:
+        """
+        Get the oldest expenses not yet mirrored to Google Sheets.
+        
+        Args:
+            limit: Maximum number of expenses returned
+            exclude_user_ids: Users whose expenses are skipped
+            only_user_ids: If given, only these users' expenses are returned
+        
+        Returns:
+            List of ExpenseInput objects in insertion order
+        """
+        sql = "SELECT * FROM expenses WHERE synced = 0"
+        params: tuple = ()
+        if exclude_user_ids:
+            sql += f" AND user_id NOT IN ({', '.join('?' * len(exclude_user_ids))})"
+            params += tuple(exclude_user_ids)
+        if only_user_ids is not None:
+            sql += f" AND user_id IN ({', '.join('?' * len(only_user_ids))})"
+            params += tuple(only_user_ids)
+        rows = self._db.query(sql + " ORDER BY id LIMIT ?", params + (limit,))
+        return [self._to_expense(row) for row in rows]
+    
+    def mark_synced(self, keys: List[str]) -> None:
+        """
+        Mark expenses as mirrored to Google Sheets.
+        
+        Args:
+            keys: Idempotency keys of the synced expenses
+        """
+        with self._db.transaction() as db:
+            db.executemany("UPDATE expenses SET synced = 1 WHERE key = ?", [(key,) for key in keys])
+    
+    def close(self) -> None:
+        """Close the database connection."""
+        self._db.close()
+
+
+class MirroredStorage:
+    """
+    Local-first storage mirrored to Google Sheets.
+    
+    Writes and reads go to the local database; a background task calls
+    sync_pending() to push unsynced rows to the spreadsheet in batches.
+    Idempotency keys make a repeated sync after a failure safe. Only rows
+    written through the bot are visible to reads, not ones added to the
+    spreadsheet by hand. Edits and deletes of synced expenses are applied to
+    the spreadsheet first, and never overlap a running sync.
+    
+    Rows are pushed per target spreadsheet. A spreadsheet that fails (e.g.
+    its share was revoked) is parked for SYNC_RETRY_DELAY seconds and its
+    users' rows are skipped meanwhile, so one tenant cannot block the sync
+    of everyone else.
+    """
+    
+    # Seconds a spreadsheet that failed to sync is skipped
+    SYNC_RETRY_DELAY = 300.0
+    
+    def __init__(self, local: SQLiteStorage, remote):
+        """
+        Initialize mirrored storage.
+        
+        Args:
+            local: Local SQLite storage serving reads and writes
+            remote: GoogleSheetsService receiving synced rows
+        """
+        self.local = local
+        self.remote = remote
+        self._sync_lock = threading.Lock()
+        # Spreadsheet key (None for the shared one) -> time it is parked until
+        self._parked: Dict[Optional[str], float] = {}
+    
+    def add_expense(self, expense: ExpenseInput, retry: bool = True) -> bool:
+        """Save an expense locally; it is synced to Sheets later."""
+        return self.local.add_expense(expense, retry)
+    
+    def add_expenses(self, expenses: List[ExpenseInput]) -> int:
+        """Save several expenses locally; they are synced to Sheets later."""
+        return self.local.add_expenses(expenses)
+    
+    def get_records_by_date_range(
+        self,
+        start_date: datetime,
+        end_date: Optional[datetime] = None,
+        user_id: Optional[int] = None
+    ) -> List[Dict]:
+        """Get records within a date range from the local database."""
+        return self.local.get_records_by_date_range(start_date, end_date, user_id)
+    
+    def get_statistics(self, period: str, user_id: int) -> Dict:
+        """Get statistics for a period from the local database."""
+        return self.local.get_statistics(period, user_id)
+    
+    def get_statistics_summary(self, user_id: int) -> Dict[str, Dict]:
+        """Get statistics for today, week and month from the local database."""
+        return self.local.get_statistics_summary(user_id)
+    
+    def get_categories(self, user_id: Optional[int] = None) -> List[str]:
+        """Get categories from the local database."""
+        return self.local.get_categories(user_id)
+    
+    def get_data_version(self, user_id: int) -> int:
+        """Get the local write counter for a user."""
+        return self.local.get_data_version(user_id)
+    
+    def get_recent_expenses(self, user_id: int, limit: int) -> List[ExpenseInput]:
+        """Get a user's most recent expenses from the local database."""
+        return self.local.get_recent_expenses(user_id, limit)
+    
+    def delete_expense(self, user_id: int, key: str) -> bool:
+        """
+        Delete an expense locally and, if already synced, from Google Sheets.
+        
+        Args:
+            user_id: Telegram user ID
+            key: Idempotency key of the expense
+        
+        Returns:
+            bool: True if the expense was deleted everywhere it was stored
+        """
+        with self._sync_lock:
+            if self.local.is_synced(user_id, key) and not self.remote.delete_expense(user_id, key):
+                return False
+            return self.local.delete_expense(user_id, key)
+    
+    def update_expense(self, expense: ExpenseInput) -> bool:
+        """
+        Overwrite an expense locally and, if already synced, in Google Sheets.
+        
+        Unsynced expenses reach the spreadsheet with the new values.
+        
+        Args:
+            expense: Expense with the new values
+        
+        Returns:
+            bool: True if the expense was updated everywhere it was stored
+        """
+        with self._sync_lock:
+            synced = self.local.is_synced(expense.user_id, expense.idempotency_key)
+            if synced and not self.remote.update_expense(expense):
+                return False
+            return self.local.update_expense(expense)
+    
+    def sync_pending(self, batch_size: int) -> int:
+        """
+        Push one batch of unsynced expenses to Google Sheets.
+        
+        Each target spreadsheet is appended to and marked synced separately;
+        a failing one is parked without affecting the others.
+        
+        Args:
+            batch_size: Maximum number of expenses pushed
+        
+        Returns:
+            int: Number of expenses fetched for syncing, so a full batch
+                means more may be pending
+        """
+        with self._sync_lock:
+            now = time.monotonic()
+            parked = {key for key, until in self._parked.items() if until > now}
+            routes = self.remote.directory.routes()
+            exclude = [user_id for user_id, key in routes.items() if key in parked]
+            only = None
+            if None in parked:
+                # Users on the shared spreadsheet are those without a route
+                only = [user_id for user_id, key in routes.items() if key not in parked]
+                if not only:
+                    return 0
+            
+            expenses = self.local.fetch_unsynced(batch_size, exclude, only)
+            
+            by_spreadsheet: Dict[Optional[str], List[ExpenseInput]] = {}
+            for expense in expenses:
+                by_spreadsheet.setdefault(routes.get(expense.user_id), []).append(expense)
+            
+            for key, group in by_spreadsheet.items():
+                try:
+                    self.remote.add_expenses(group)
+                except Exception as e:
+                    logger.warning(
+                        f"Mirror sync to {key or Config.GOOGLE_SHEET_NAME} failed, "
+                        f"retrying in {self.SYNC_RETRY_DELAY:.0f} s: {e}"
+                    )
+                    self._parked[key] = now + self.SYNC_RETRY_DELAY
+                    continue
+                self._parked.pop(key, None)
+                self.local.mark_synced([expense.idempotency_key for expense in group])
+            
+            return len(expenses)
+    
+    def close(self) -> None:
+        """Close both backends."""
+        self.local.close()
+        self.remote.close()
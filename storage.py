@@ -0,0 +1,119 @@
+"""
+Storage backend module.
+Defines the interface handlers use to store and query expenses, and builds
+the backend selected by Config.STORAGE_BACKEND.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Protocol
+
+from config import Config
+from validators import ExpenseInput
+
+
+class ExpenseStorage(Protocol):
+    """
+    Interface implemented by every expense storage backend.
+    
+    Records are returned as dictionaries keyed by the spreadsheet header
+    names ('Date', 'Category', 'Amount', 'Comment', 'User ID', 'Key').
+    """
+    
+    def add_expense(self, expense: ExpenseInput, retry: bool = True) -> bool:
+        """Save one expense; return True on success."""
+        ...
+    
+    def add_expenses(self, expenses: List[ExpenseInput]) -> int:
+        """Save a batch of expenses; return how many are stored."""
+        ...
+    
+    def get_records_by_date_range(
+        self,
+        start_date: datetime,
+        end_date: Optional[datetime] = None,
+        user_id: Optional[int] = None
+    ) -> List[Dict]:
+        """Get records within a date range, optionally for one user."""
+        ...
+    
+    def get_statistics(self, period: str, user_id: int) -> Dict:
+        """Get total and category breakdown for 'today', 'week' or 'month'."""
+        ...
+    
+    def get_statistics_summary(self, user_id: int) -> Dict[str, Dict]:
+        """Get statistics for today, week and month at once."""
+        ...
+    
+    def get_categories(self, user_id: Optional[int] = None) -> List[str]:
+        """Get used categories combined with the defaults, optionally for one user's data."""
+        ...
+    
+    def get_recent_expenses(self, user_id: int, limit: int) -> List[ExpenseInput]:
+        """Get a user's most recently saved expenses, newest first."""
+        ...
+    
+    def delete_expense(self, user_id: int, key: str) -> bool:
+        """Delete a user's expense by idempotency key; return True if it was deleted."""
+        ...
+    
+    def update_expense(self, expense: ExpenseInput) -> bool:
+        """Overwrite the expense with the same user ID and idempotency key; return True on success."""
+        ...
+    
+    def get_data_version(self, user_id: int) -> int:
+        """Get a counter that changes whenever the user's data changes."""
+        ...
+    
+    def close(self) -> None:
+        """Release connections held by the backend."""
+        ...
+
+
+def create_storage() -> ExpenseStorage:
+    """
+    Create the storage backend selected in the configuration.
+    
+    STORAGE_BACKEND values:
+        sheets - Google Sheets only (default)
+        sqlite - local SQLite database only
+        mirror - local SQLite first, synced to Google Sheets in the background
+    
+    Returns:
+        Storage backend instance
+    
+    Raises:
+        ValueError: If STORAGE_BACKEND is unknown
+    """
+    backend = Config.STORAGE_BACKEND
+    
+    if backend == "sheets":
+        from google_service import GoogleSheetsService
+        return GoogleSheetsService()
+    
+    if backend == "sqlite":
+        from sqlite_storage import SQLiteStorage
+        return SQLiteStorage(Config.LOCAL_DB_PATH)
+    
+    if backend == "mirror":
+        from google_service import GoogleSheetsService
+        from sqlite_storage import MirroredStorage, SQLiteStorage
+        return MirroredStorage(SQLiteStorage(Config.LOCAL_DB_PATH), GoogleSheetsService())
+    
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+def get_sheets_service(storage: ExpenseStorage):
+    """
+    Get the Google Sheets service behind a storage backend, if any.
+    
+    Args:
+        storage: Storage backend
+    
+    Returns:
+        GoogleSheetsService or None for purely local storage
+    """
+    from google_service import GoogleSheetsService
+    
+    if isinstance(storage, GoogleSheetsService):
+        return storage
+    return getattr(storage, "remote", None)
@@ -0,0 +1,204 @@
+"""
+Structured logging module for the Expense Tracker Bot.
+Sends log records through a queue to a background writer thread, formats
+them as JSON lines with the ID of the update being handled, and provides
+sampling for high-volume events and timing of external calls.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+
+# ID of the update being handled; copied into worker threads by asyncio.to_thread
+correlation_id: ContextVar[str] = ContextVar("correlation_id", default="-")
+
+# Attributes every LogRecord has; anything else was passed via `extra`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class CorrelationIdFilter(logging.Filter):
+    """Stamp records with the current correlation ID in the emitting context."""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Add the correlation_id attribute; never drops records."""
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects including `extra` fields."""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Format a record.
+        
+        Args:
+            record: Log record
+        
+        Returns:
+            JSON line
+        """
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level: str = "INFO", log_format: str = "json") -> None:
+    """
+    Route all logging through a queue to a stdout writer thread.
+    
+    Logging calls on the event loop only put the record on an in-memory
+    queue; formatting and the blocking stdout write happen in the listener
+    thread. The listener is flushed and stopped at interpreter exit.
+    
+    Args:
+        level: Root log level name
+        log_format: 'json' for JSON lines, 'text' for plain text
+    """
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if log_format == "text":
+        stream_handler.setFormatter(logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s'
+        ))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+    
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(CorrelationIdFilter())
+    
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level.upper())
+    
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+
+class LogSampler:
+    """
+    Limit how often a high-volume event is logged.
+    
+    Allows `burst` records per event within each `interval` seconds and
+    counts the rest; the next allowed record reports how many were skipped,
+    so spam cannot flood the log but its volume stays visible.
+    """
+    
+    def __init__(self, interval: float = 60.0, burst: int = 5):
+        """
+        Initialize the sampler.
+        
+        Args:
+            interval: Sampling window in seconds
+            burst: Records logged per event within a window
+        """
+        self.interval = interval
+        self.burst = max(1, burst)
+        self._lock = threading.Lock()
+        # event -> [window start, logged in window, suppressed since last log]
+        self._events: Dict[str, list] = {}
+    
+    def allow(self, event: str) -> Optional[int]:
+        """
+        Record an occurrence of an event.
+        
+        Args:
+            event: Event name
+        
+        Returns:
+            Number of occurrences suppressed since the last logged one if
+            this occurrence should be logged, None if it should be skipped
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._events.setdefault(event, [now, 0, 0])
+            if now - state[0] >= self.interval:
+                state[0], state[1] = now, 0
+            
+            if state[1] >= self.burst:
+                state[2] += 1
+                return None
+            
+            suppressed = state[2]
+            state[1] += 1
+            state[2] = 0
+            return suppressed
+
+
+@contextmanager
+def timed(logger: logging.Logger, operation: str, **fields: Any) -> Iterator[None]:
+    """
+    Log the duration of a block of code, e.g. one Sheets API call.
+    
+    Args:
+        logger: Logger receiving the timing record
+        operation: Operation name logged in the 'op' field
+        **fields: Extra fields added to the record
+    """
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    finally:
+        duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        logger.info(
+            f"{operation} {status} in {duration_ms} ms",
+            extra={"op": operation, "status": status, "duration_ms": duration_ms, **fields}
+        )
+
+
+class CorrelationMiddleware(BaseMiddleware):
+    """
+    Outer update middleware setting the correlation ID for an update.
+    
+    Registered first, so every record logged while the update is handled,
+    including access checks and worker-thread Sheets calls, carries its ID.
+    """
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        """
+        Run the rest of the chain with the update's correlation ID set.
+        
+        Args:
+            handler: Next handler in chain
+            event: Incoming update
+            data: Additional data
+        
+        Returns:
+            Result of handler
+        """
+        value = f"upd-{event.update_id}" if isinstance(event, Update) else "-"
+        token = correlation_id.set(value)
+        try:
+            return await handler(event, data)
+        finally:
+            correlation_id.reset(token)
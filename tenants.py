@@ -0,0 +1,139 @@
+"""
+Spreadsheet routing module.
+Maps users to their own Google Sheets spreadsheet, so each user (or group
+of users sharing one spreadsheet) reads and writes only its own data.
+"""
+
+import re
+import threading
+from typing import Dict, List, Optional
+
+from config import Config
+from sqlite_storage import LocalDatabase
+
+
+# Spreadsheet key as it appears in a Google Sheets URL
+SPREADSHEET_KEY_PATTERN = re.compile(r"^[A-Za-z0-9_-]{20,}$")
+SPREADSHEET_URL_PATTERN = re.compile(r"/spreadsheets/d/([A-Za-z0-9_-]+)")
+
+
+def parse_spreadsheet_key(text: str) -> str:
+    """
+    Extract a spreadsheet key from a Google Sheets URL or a bare key.
+    
+    Args:
+        text: Spreadsheet URL or key
+    
+    Returns:
+        Spreadsheet key
+    
+    Raises:
+        ValueError: If the text is neither a spreadsheet URL nor a key
+    """
+    text = text.strip()
+    match = SPREADSHEET_URL_PATTERN.search(text)
+    key = match.group(1) if match else text
+    
+    if not SPREADSHEET_KEY_PATTERN.match(key):
+        raise ValueError(f"Not a Google Sheets link or key: {text}")
+    return key
+
+
+class SpreadsheetDirectory:
+    """
+    Local mapping of user IDs to spreadsheet keys.
+    
+    Users without an entry use the shared GOOGLE_SHEET_NAME spreadsheet.
+    Several users pointing to the same key share one spreadsheet, which is
+    how a group keeps joint accounts. The whole mapping is kept in memory,
+    so routing a Sheets call costs a dict lookup.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS user_spreadsheets (
+            user_id INTEGER PRIMARY KEY,
+            spreadsheet_key TEXT NOT NULL
+        );
+    """
+    
+    def __init__(self, path: str):
+        """
+        Open the directory and load the mapping.
+        
+        Args:
+            path: Local database file path
+        """
+        self._db = LocalDatabase(path, self.SCHEMA)
+        self._lock = threading.Lock()
+        self._keys: Dict[int, str] = {
+            row['user_id']: row['spreadsheet_key']
+            for row in self._db.query("SELECT user_id, spreadsheet_key FROM user_spreadsheets")
+        }
+    
+    def get(self, user_id: Optional[int]) -> Optional[str]:
+        """
+        Get the spreadsheet key a user is routed to.
+        
+        Args:
+            user_id: Telegram user ID, or None for the shared spreadsheet
+        
+        Returns:
+            Spreadsheet key, or None for the shared spreadsheet
+        """
+        if user_id is None:
+            return None
+        return self._keys.get(user_id)
+    
+    def set(self, user_id: int, spreadsheet_key: str) -> None:
+        """
+        Route a user to a spreadsheet.
+        
+        Args:
+            user_id: Telegram user ID
+            spreadsheet_key: Key of a spreadsheet shared with the service account
+        """
+        with self._lock:
+            with self._db.transaction() as db:
+                db.execute(
+                    "INSERT INTO user_spreadsheets (user_id, spreadsheet_key) VALUES (?, ?) "
+                    "ON CONFLICT (user_id) DO UPDATE SET spreadsheet_key = excluded.spreadsheet_key",
+                    (user_id, spreadsheet_key)
+                )
+            self._keys[user_id] = spreadsheet_key
+    
+    def remove(self, user_id: int) -> bool:
+        """
+        Route a user back to the shared spreadsheet.
+        
+        Args:
+            user_id: Telegram user ID
+        
+        Returns:
+            bool: True if the user had its own spreadsheet
+        """
+        with self._lock:
+            with self._db.transaction() as db:
+                db.execute("DELETE FROM user_spreadsheets WHERE user_id = ?", (user_id,))
+            return self._keys.pop(user_id, None) is not None
+    
+    def routes(self) -> Dict[int, str]:
+        """Get a snapshot of the user to spreadsheet key mapping."""
+        return dict(self._keys)
+    
+    def spreadsheet_keys(self) -> List[str]:
+        """Get the distinct keys of all routed spreadsheets."""
+        return sorted(set(self._keys.values()))
+    
+    def close(self) -> None:
+        """Close the database connection."""
+        self._db.close()
+
+
+def create_spreadsheet_directory() -> SpreadsheetDirectory:
+    """
+    Create the spreadsheet directory from the application configuration.
+    
+    Returns:
+        SpreadsheetDirectory using LOCAL_DB_PATH
+    """
+    return SpreadsheetDirectory(Config.LOCAL_DB_PATH)
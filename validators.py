@@ -3,79 +3,112 @@ Validation models for expense tracking bot.
 Uses Pydantic for data validation and parsing.
 """
 
+from dataclasses import dataclass, field
 from datetime import datetime
+from functools import lru_cache
 import re
-from typing import Optional
-from pydantic import BaseModel, Field, field_validator
+from typing import Annotated, Any, ClassVar, Dict, Iterable, List, Literal, Optional
+from pydantic import BaseModel, BeforeValidator, Field, StringConstraints, TypeAdapter, field_validator
 
 
-class ExpenseInput(BaseModel):
+@dataclass(frozen=True, slots=True)
+class ExpenseInput:
     """
-    Model for validating expense input data.
+    Expense row used throughout the bot.
+    
+    A frozen, slotted dataclass: cheap to create and to pass between the
+    handlers, storage backends and background tasks. Constructing it
+    directly performs no validation, which is meant for data that is
+    already trusted (rows read back from storage, recurring rules). Input
+    from users goes through validate() or validate_many() exactly once.
     
     Attributes:
         category: Expense category (e.g., food, transport)
         amount: Expense amount (must be positive)
-        comment: Optional comment about the expense
         user_id: Telegram user ID
+        comment: Optional comment about the expense
         date: Timestamp of the expense
+        idempotency_key: Unique key of the source message (chat_id:message_id)
     """
     
-    category: str = Field(..., min_length=1, max_length=50)
-    amount: float = Field(..., gt=0)
-    comment: Optional[str] = Field(default="", max_length=200)
+    category: Annotated[str, StringConstraints(strip_whitespace=True, to_lower=True, min_length=1, max_length=50)]
+    amount: Annotated[float, Field(gt=0)]
     user_id: int
-    date: datetime = Field(default_factory=datetime.now)
+    comment: Annotated[
+        str,
+        BeforeValidator(lambda v: "" if v is None else v),
+        StringConstraints(strip_whitespace=True, max_length=200)
+    ] = ""
+    date: datetime = field(default_factory=datetime.now)
+    idempotency_key: Annotated[Optional[str], Field(max_length=100)] = None
     
-    @field_validator('category')
     @classmethod
-    def validate_category(cls, v: str) -> str:
+    def validate(cls, **data: Any) -> 'ExpenseInput':
         """
-        Validate and normalize category name.
+        Validate and normalize user input into an expense.
+        
+        Category is stripped and lowercased, comment is stripped.
         
         Args:
-            v: Category string to validate
+            **data: Expense fields
             
         Returns:
-            Normalized category string (lowercase, stripped)
+            Validated ExpenseInput
+            
+        Raises:
+            pydantic.ValidationError: If a field is invalid (a ValueError subclass)
         """
-        return v.strip().lower()
+        return _expense_adapter().validate_python(data)
     
-    @field_validator('comment')
     @classmethod
-    def validate_comment(cls, v: Optional[str]) -> str:
+    def validate_many(cls, items: Iterable[Dict[str, Any]]) -> List['ExpenseInput']:
         """
-        Validate and normalize comment.
+        Validate a batch of expenses in one call, e.g. for imports.
         
         Args:
-            v: Comment string to validate
+            items: Dictionaries of expense fields
             
         Returns:
-            Normalized comment string (stripped)
+            List of validated ExpenseInput objects
+            
+        Raises:
+            pydantic.ValidationError: If any item is invalid, listing every error
         """
-        if v is None:
-            return ""
-        return v.strip()
+        return _expense_list_adapter().validate_python(list(items))
     
     def to_sheet_row(self) -> list:
         """
         Convert expense to a row format for Google Sheets.
         
         Returns:
-            List containing [date, category, amount, comment, user_id]
+            List containing [date, category, amount, comment, user_id, key]
         """
         return [
             self.date.strftime("%Y-%m-%d %H:%M"),
             self.category,
             self.amount,
             self.comment,
-            self.user_id
+            self.user_id,
+            self.idempotency_key or ""
         ]
 
 
-class ParsedMessage(BaseModel):
+@lru_cache(maxsize=None)
+def _expense_adapter() -> TypeAdapter:
+    """Build the expense validator once, on first use."""
+    return TypeAdapter(ExpenseInput)
+
+
+@lru_cache(maxsize=None)
+def _expense_list_adapter() -> TypeAdapter:
+    """Build the batch expense validator once, on first use."""
+    return TypeAdapter(List[ExpenseInput])
+
+
+@dataclass(frozen=True, slots=True)
+class ParsedMessage:
     """
-    Model for parsed user message.
+    Expense fields parsed from a user message, before validation.
     
     Attributes:
         category: Expense category (optional if only amount provided)
@@ -86,7 +119,7 @@ class ParsedMessage(BaseModel):
     
     category: Optional[str] = None
     amount: Optional[float] = None
-    comment: Optional[str] = ""
+    comment: str = ""
     date: Optional[datetime] = None
     
     @staticmethod
@@ -189,3 +222,91 @@ class ParsedMessage(BaseModel):
         comment = " ".join(parts[2:]) if len(parts) > 2 else ""
         
         return cls(category=category, amount=amount, comment=comment, date=parsed_date)
+
+
+
+class RecurringRuleInput(BaseModel):
+    """
+    Model for a recurring expense rule entered with /recurring add.
+    
+    Attributes:
+        frequency: How often the expense repeats (daily, weekly, monthly)
+        day: Weekday for weekly rules (0 = Monday), day of month for monthly
+            rules (clamped to the month's length), unused for daily rules
+        category: Expense category
+        amount: Expense amount (must be positive)
+        comment: Optional comment
+    """
+    
+    frequency: Literal['daily', 'weekly', 'monthly']
+    day: int = Field(default=0, ge=0, le=31)
+    category: str = Field(..., min_length=1, max_length=50)
+    amount: float = Field(..., gt=0)
+    comment: str = Field(default="", max_length=200)
+    
+    WEEKDAYS: ClassVar[Dict[str, int]] = {
+        'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4, 'sat': 5, 'sun': 6
+    }
+    
+    @field_validator('category')
+    @classmethod
+    def validate_category(cls, v: str) -> str:
+        """Normalize category name (lowercase, stripped)."""
+        return v.strip().lower()
+    
+    @classmethod
+    def parse_from_args(cls, text: str) -> 'RecurringRuleInput':
+        """
+        Parse a recurring rule from command arguments.
+        
+        Supports formats:
+        - "monthly DAY category amount [comment]" (e.g., monthly 1 rent 150000)
+        - "weekly WEEKDAY category amount [comment]" (e.g., weekly mon gym 5000)
+        - "daily category amount [comment]"
+        
+        Args:
+            text: Arguments after "/recurring add"
+            
+        Returns:
+            RecurringRuleInput object with parsed data
+            
+        Raises:
+            ValueError: If text cannot be parsed
+        """
+        parts = text.strip().split()
+        if not parts:
+            raise ValueError("Empty rule")
+        
+        frequency = parts[0].lower()
+        parts = parts[1:]
+        
+        if frequency == 'daily':
+            day = 0
+        elif frequency == 'weekly':
+            if not parts or parts[0].lower()[:3] not in cls.WEEKDAYS:
+                raise ValueError("Weekly rules need a weekday (mon..sun)")
+            day = cls.WEEKDAYS[parts[0].lower()[:3]]
+            parts = parts[1:]
+        elif frequency == 'monthly':
+            if not parts or not parts[0].isdigit() or not 1 <= int(parts[0]) <= 31:
+                raise ValueError("Monthly rules need a day of month (1-31)")
+            day = int(parts[0])
+            parts = parts[1:]
+        else:
+            raise ValueError(f"Unknown frequency: {frequency}. Use daily, weekly or monthly")
+        
+        if len(parts) < 2:
+            raise ValueError("Expected: category amount [comment]")
+        
+        try:
+            amount = float(parts[1])
+        except ValueError:
+            raise ValueError(f"Invalid amount: {parts[1]}")
+        
+        return cls(
+            frequency=frequency,
+            day=day,
+            category=parts[0],
+            amount=amount,
+            comment=" ".join(parts[2:])
+        )